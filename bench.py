@@ -0,0 +1,251 @@
+# ####################################
+#   author: Anthony Tooman
+#   date:   202111
+#   desc:   benchmarks of the opteq stages on synthetic data
+#           python bench.py [SIZE[,SIZE...]] [BASELINE] [REPEATS]
+#           results as json in PATHBENCH, compared to the json BASELINE when given
+# ####################################
+
+
+import sys
+import os
+import io
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import contextlib
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import opteq.measures as optmeas
+import opteq.option as optopt
+import opteq.time as opttime
+import opteq.data as optdata
+import opteq.hurst as opthurst
+import opteq.polyfit as optfit
+
+PATHBENCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench')
+SEED = 0
+REPEATS = 3
+# slower than the baseline by more than this ratio is reported as a regression
+TOLERANCE = 1.2
+
+# obs and bar frequency, minute bars are 390 a day
+SIZES = {'1y': (252, 'B'), '5y': (5*252, 'B'), '20y': (20*252, 'B')
+    , '1y-min': (252*390, 'min'), '20y-min': (20*252*390, 'min')}
+SIZESDEFAULT = ['1y', '5y', '20y']
+
+# as main
+prd2 = 2
+prd3 = 3
+prd252 = 252
+obsout = 252
+quants = [0.01, 0.02, 0.03, 0.05, 0.10, 0.15, 0.20, 0.30, 0.50, 0.70, 0.80, 0.85, 0.90, 0.95, 0.97, 0.98, 0.99]
+
+
+def getgbm(_obs, _freq='B', _seed=SEED, _mu=0.07, _sigma=0.18, _s0=3000.):
+    '''
+    desc:   deterministic daily df (open, high, low, close, adjclose, volume) of a geometric
+            brownian motion, _mu and _sigma annual. minute bars run from 09:30 on business days
+    '''
+    rng = np.random.default_rng(_seed)
+    if _freq == 'min':
+        days = pd.bdate_range('2000-01-03', periods=-(-_obs//390)).values
+        minutes = np.timedelta64(9*60 + 30, 'm') + np.arange(390)*np.timedelta64(1, 'm')
+        index = pd.DatetimeIndex((days[:, None] + minutes[None, :]).ravel()[:_obs])
+        dt = 1/(252*390)
+    else:
+        index = pd.bdate_range('2000-01-03', periods=_obs)
+        dt = 1/252
+    scale = _sigma*np.sqrt(dt)
+    close = _s0*np.exp(np.cumsum((_mu - _sigma**2/2)*dt + scale*rng.standard_normal(_obs)))
+    open = np.concatenate([[_s0], close[:-1]])*np.exp(0.2*scale*rng.standard_normal(_obs))
+    high = np.maximum(open, close)*np.exp(np.abs(0.5*scale*rng.standard_normal(_obs)))
+    low = np.minimum(open, close)*np.exp(-np.abs(0.5*scale*rng.standard_normal(_obs)))
+    volume = rng.integers(10**6, 5*10**6, _obs)
+    return pd.DataFrame({'open': open, 'high': high, 'low': low, 'close': close, 'adjclose': close, 'volume': volume}, index=index)
+
+def getscheds(_dtestart, _dteend):
+    '''
+    desc:   trading days and spx weekly expiry schedules, as opteq.getscheds
+    '''
+    extdays = optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _freq='B', _busconv='nat')
+    exscheds = [optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _freq=freq, _busconv=busconv)
+        for freq, busconv in [('W-MON', 'following'), ('W-WED', 'preceding'), ('W-FRI', 'preceding')]]
+    return extdays, exscheds
+
+def getstages(_df):
+    '''
+    desc:   {stage: function} of the stages of main on _df. the inputs of each stage are
+            computed once here, a stage only repeats its own work. stages that do not
+            apply are left out: the expiry schedules and underlying of intraday bars,
+            which run on trading days, and polyfit with fewer than 3*prd252 bars
+    '''
+    df = _df
+    intraday = bool((df.index != df.index.normalize()).any())
+    with contextlib.redirect_stdout(io.StringIO()):
+        idx = opttime.getidx(_group='idx', _df=df)
+        features = optmeas.getfeaturegraph(_group='rtn', _prds=[prd2, prd3, prd252]).getrtn(df).getdf()
+        rtndf = pd.concat([idx, features], axis=1)
+        run = optmeas.runner(_idx=idx['idx'], _rtn=rtndf['rtn'], _group='runner')
+        run.setrun()
+        run.setdescribe(_quantiles=quants)
+        if not intraday:
+            scheds = getscheds(df.index.min(), df.index.max())
+            for sched in [scheds[0]] + scheds[1]: sched.setsched('option')
+            under = optopt.underlying(_group='option', _idx=idx['idx'], _rtn=rtndf['rtn'], _tdays=scheds[0], _scheds=scheds[1])
+            under.setmeasures()
+            under.setdescribe(_quantiles=quants)
+            under.setdescribepaths(_quantiles=quants)
+
+    def rtnset(_method, _columns, **_kwargs):
+        def stage():
+            rtn = optmeas.rtn(_group='rtn', _columnar=True)
+            for column in _columns:
+                rtn.setcolumn('rtn', column, features[('rtn', column)])
+            getattr(rtn, _method)(_group='rtn', **_kwargs)
+            return rtn.getdf()
+        return stage
+
+    def polyfit(_solver):
+        def stage():
+            fit = optfit.polyfit(_group='rtn', _name='lhln^2', _df=rtndf['rtn'], _obs=prd252)
+            fit.runner(_solver=_solver)
+            return fit.getdf()
+        return stage
+
+    def schedule():
+        extdays, exscheds = getscheds(df.index.min(), df.index.max())
+        for sched in [extdays] + exscheds: sched.setsched('option')
+
+    def setrun():
+        runner = optmeas.runner(_idx=idx['idx'], _rtn=rtndf['rtn'], _group='runner')
+        runner.setrun()
+
+    def setmeasures():
+        underrtn = optopt.underlying(_group='option', _idx=idx['idx'], _rtn=rtndf['rtn'], _tdays=scheds[0], _scheds=scheds[1])
+        underrtn.setmeasures()
+
+    def writexlsx():
+        group, dfs = [f'{run.getgrp()}desc', 'inst', 'rtn', run.getgrp()], [run.dfdesc, df, rtndf, run.getdf()]
+        if not intraday:
+            group, dfs = [f'{under.getgrp()}desc', f'{under.getgrp()}pathdesc'] + group + [under.getgrp()], [under.dfdesc, under.dfpathdesc] + dfs + [under.getdf()]
+        with tempfile.TemporaryDirectory() as path:
+            optdata.writexlsx(_file=os.path.join(path, 'bench.xlsx'), _group=group, _df=dfs, _prd=[obsout]*len(group))
+
+    stages = {'getidx': lambda: opttime.getidx(_group='idx', _df=df)
+        , 'rtn.setrtn': rtnset('setrtn', [], _name='c', _feature1=df['adjclose'], _feature2=df['adjclose'], _prd=1)
+        , 'rtn.setstats': rtnset('setstats', ['lhln^2'], _feature='lhln^2', _prd=[prd2, prd3, prd252])
+        , 'rtn.setmax': rtnset('setmax', ['lln^2', 'hln^2'], _name='lhln^2', _feature1='lln^2', _feature2='hln^2')
+        , 'rtn.setrsi': rtnset('setrsi', [], _name='c', _feature=df['adjclose'], _length=14)
+        , 'rtn.sethurst': rtnset('sethurst', [], _name='c', _feature=df['adjclose'], _prd=5*26)
+        , 'featuregraph.getrtn': lambda: optmeas.getfeaturegraph(_group='rtn', _prds=[prd2, prd3, prd252]).getrtn(df)
+        , 'hurst.gethurst': lambda: opthurst.hurst().gethurst(df['adjclose'].values[-5*52:])
+        , 'runner.setrun': setrun
+        , 'runner.setdescribe': lambda: run.setdescribe(_quantiles=quants)
+        , 'writexlsx': writexlsx}
+    # the rank over prd252, the fit window and the rows it estimates take 3*prd252 bars
+    if df.shape[0] >= 3*prd252:
+        stages.update({f'polyfit.{solver}': polyfit(solver) for solver in ['curve_fit', 'lstsq', 'rls']})
+    if not intraday:
+        stages.update({'schedule': schedule, 'underlying.setmeasures': setmeasures
+            , 'underlying.setdescribe': lambda: under.setdescribe(_quantiles=quants)})
+    return stages
+
+def gettime(_stage, _repeats=REPEATS):
+    '''
+    desc:   seconds of each of _repeats runs of _stage and its error. the stages print
+            "failed" rather than raise, their output is checked for it
+    '''
+    seconds = []
+    error = None
+    for repeat in range(_repeats):
+        with contextlib.redirect_stdout(io.StringIO()) as out, warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            start = time.perf_counter()
+            try:
+                _stage()
+            except Exception as e:
+                error = repr(e)
+            seconds.append(time.perf_counter() - start)
+        failed = [line for line in out.getvalue().split('\n') if 'failed' in line]
+        if failed:
+            error = '; '.join(failed)
+        if error is not None:
+            break
+    return seconds, error
+
+def getimporttime(_repeats=REPEATS):
+    '''
+    desc:   seconds to import the opteq modules in a new interpreter
+    '''
+    code = 'import time; start = time.perf_counter(); import opteq.measures, opteq.option, opteq.instrument, opteq.data; print(time.perf_counter() - start)'
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    return [float(subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, check=True).stdout) for repeat in range(_repeats)]
+
+def getcommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__))
+            , capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def bench(_sizes=SIZESDEFAULT, _repeats=REPEATS):
+    '''
+    desc:   time every stage on every size, median and min seconds of _repeats runs
+    '''
+    seconds = getimporttime(_repeats)
+    results = {'import': {'opteq': {'seconds': float(np.median(seconds)), 'min': float(np.min(seconds)), 'error': None}}}
+    for size in _sizes:
+        obs, freq = SIZES[size]
+        stages = getstages(getgbm(obs, freq))
+        results[size] = {}
+        for stage, function in stages.items():
+            seconds, error = gettime(function, _repeats)
+            results[size][stage] = {'seconds': float(np.median(seconds)), 'min': float(np.min(seconds)), 'error': error}
+            print(f'bench {size:8} {stage:24} {np.median(seconds):10.4f}s' + (f' failed {error}' if error else ''))
+    return {'commit': getcommit(), 'date': datetime.now().isoformat(timespec='seconds')
+        , 'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__
+        , 'platform': platform.platform(), 'seed': SEED, 'repeats': _repeats, 'results': results}
+
+def compare(_results, _baseline, _tolerance=TOLERANCE):
+    '''
+    desc:   ratio of the fastest run of each stage to the baseline, stages slower than
+            _tolerance are regressions
+    '''
+    rows = []
+    for size, stages in _results['results'].items():
+        for stage, result in stages.items():
+            base = _baseline['results'].get(size, {}).get(stage)
+            if base is None or base['error'] or result['error']:
+                continue
+            rows.append({'size': size, 'stage': stage, 'baseline': base['min'], 'seconds': result['min']
+                , 'ratio': result['min']/base['min'] if base['min'] else np.nan})
+    df = pd.DataFrame(rows, columns=['size', 'stage', 'baseline', 'seconds', 'ratio'])
+    df['regression'] = df['ratio'] > _tolerance
+    return df
+
+if __name__ == "__main__":
+    '''
+    python bench.py [SIZE[,SIZE...]] [BASELINE] [REPEATS]
+    '''
+    sizes = sys.argv[1].split(',') if len(sys.argv) > 1 and sys.argv[1] else SIZESDEFAULT
+    baseline = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else None
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else REPEATS
+    results = bench(sizes, repeats)
+
+    os.makedirs(PATHBENCH, exist_ok=True)
+    file = os.path.join(PATHBENCH, f'{results["date"][:10]}-{(results["commit"] or "local")[:8]}.json')
+    with open(file, 'w') as out:
+        json.dump(results, out, indent=1)
+    print(f'bench results {file}')
+
+    if baseline is not None:
+        with open(baseline) as base:
+            df = compare(results, json.load(base))
+        print(df.to_string(index=False))
+        print(f'bench regressions {df.regression.sum()} of {df.shape[0]} stages against {baseline}')
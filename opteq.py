@@ -6,6 +6,9 @@
 
 
 import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 
@@ -20,6 +23,10 @@ import opteq.polyfit as optfit
 PATHREL = '/Users/anthony/Google Drive/dev/py/opteq/data'
 PATHDATA = '/Users/anthony/Google Drive/opteq/data'
 SYMBOL = '^GSPC'
+WORKERS = None
+EXCH = 'CME_Equity'
+# report format, xlsx or a parquet, csv bundle
+REPORT = 'xlsx'
 
 # get s&p 500 (spx) data
 periods=[13*5, 26*5, 52*5]
@@ -36,12 +43,33 @@ prd252=252
 
 quants = [0.01, 0.02, 0.03, 0.05, 0.10, 0.15, 0.20, 0.30, 0.50, 0.70, 0.80, 0.85, 0.90, 0.95, 0.97, 0.98, 0.99]
 
-def main():
+# schedules shared by the universe workers, forked into or set once per worker
+SCHEDS = None
+
+def getscheds(_dtestart, _dteend, _holidays=None):
+    '''
+    desc:   trading days and spx weekly expiry schedules
+    '''
+    # all trading days. note all schedules are -/+ 5 days
+    extdays = optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _exch=EXCH, _freq='B', _busconv='nat', _holidays=_holidays)
+    # spx weekly expiries
+    exschedmon = optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _exch=EXCH, _freq='W-MON', _busconv='following', _holidays=_holidays)
+    exschedwed = optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _exch=EXCH, _freq='W-WED', _busconv='preceding', _holidays=_holidays)
+    exschedfri = optopt.schedule(_dtestart=_dtestart, _dteend=_dteend, _exch=EXCH, _freq='W-FRI', _busconv='preceding', _holidays=_holidays)
+    return extdays, [exschedmon, exschedwed, exschedfri]
+
+def setscheds(_scheds):
+    '''
+    desc:   process pool initializer, keep the shared schedules
+    '''
+    global SCHEDS
+    SCHEDS = _scheds
+    return
+
+def main(_symbol=SYMBOL, _path=PATHDATA, _scheds=None):
     # underlying symbol
-    under = optinst.stock(_dataprovider=optdata.yahoofin(), _symbol=SYMBOL, _region='US', _path=PATHDATA)
-    under.getdaily(_interval='1d', _obsin=f'{obsin}d', _events='div,split', _scale=1.0)
-    under.writedaily()
-    under.readdaily()
+    under = optinst.stock(_dataprovider=optdata.yahoofin(), _symbol=_symbol, _region='US', _path=_path)
+    under.refreshdaily(_interval='1d', _obsin=f'{obsin}d', _events='div,split', _scale=1.0)
     under.setidx()
 
     # common index
@@ -54,36 +82,13 @@ def main():
 
     # return measures
     # dependents: run, underlying
-    # features: Open (o)
-    rtn = optmeas.rtn(_group='rtn')
-    rtn.setrtn(_group='rtn', _name='o', _feature1=under.df[under.symbol]['open'], _feature2=under.df[under.symbol]['adjclose'], _prd=prd1)
-    rtn.setstats(_group='rtn', _feature='oln^2', _prd=prd3)
-
-    # features: Close (c)
-    rtn.setrtn(_group='rtn', _name='c', _feature1=under.df[under.symbol]['adjclose'], _feature2=under.df[under.symbol]['adjclose'], _prd=prd1)
-    rtn.setstats(_group='rtn', _feature='cln^2', _prd=prd3)
-
-    rtn.setrsi(_group='rtn', _name='c', _feature=under.df[under.symbol]['adjclose'], _length=14)
-    rtn.setstats(_group='rtn', _feature='c-rsi', _prd=prd3)
-
-    # feature: Low (l), High (h)
-    rtn.setrtn(_group='rtn', _name='l', _feature1=under.df[under.symbol]['low'], _feature2=under.df[under.symbol]['adjclose'], _prd=prd1)
-    rtn.setstats(_group='rtn', _feature='lln^2', _prd=prd3)
-
-    rtn.setrtn(_group='rtn', _name='h', _feature1=under.df[under.symbol]['high'], _feature2=under.df[under.symbol]['adjclose'], _prd=prd1)
-    rtn.setstats(_group='rtn', _feature='hln^2', _prd=prd3)
-
-    rtn.setmax(_group='rtn', _name='lhln^2', _feature1='lln^2', _feature2='hln^2')
-    rtn.setstats(_group='rtn', _feature='lhln^2', _prd=prd2)
-    rtn.setstats(_group='rtn', _feature='lhln^2', _prd=prd3)
-    rtn.setstats(_group='rtn', _feature='lhln^2', _prd=prd252)
-
-    rtn.setrsi(_group='rtn', _name='lhln^2', _feature=rtn.df[('rtn','lhln^2')], _length=14)
+    # features: Open (o), Close (c), Low (l), High (h), declared in optmeas.getfeaturegraph
+    rtn = optmeas.getfeaturegraph(_group='rtn', _prds=[prd2, prd3, prd252]).getrtn(under.df[under.symbol])
     rtn.df = pd.concat([idx, rtn.getdf()], axis=1)
 
     # setpolyfit
     fit = optfit.polyfit(_group='rtn', _name='lhln^2', _df=rtn.df['rtn'], _obs=prd252)
-    fit.runner()
+    fit.runner(_solver='lstsq')
     rtn.df = pd.concat([rtn.getdf(), fit.getdf()], axis=1)
 
     # run measures
@@ -91,28 +96,133 @@ def main():
     runner.setrun()
     runner.setdescribe(_quantiles=quants)
 
-    # all trading days. note all schedules are -/+ 5 days
-    extdays = optopt.schedule(_dtestart=dtestart, _dteend=dteend, _exch='CME_Equity', _freq='B', _busconv='nat')
-    # spx weekly expiries
-    exschedmon = optopt.schedule(_dtestart=dtestart, _dteend=dteend, _exch='CME_Equity', _freq='W-MON', _busconv='following')
-    exschedwed = optopt.schedule(_dtestart=dtestart, _dteend=dteend, _exch='CME_Equity', _freq='W-WED', _busconv='preceding')
-    exschedfri = optopt.schedule(_dtestart=dtestart, _dteend=dteend, _exch='CME_Equity', _freq='W-FRI', _busconv='preceding')
+    # trading days and expiries, shared across a universe or set per symbol
+    extdays, exscheds = getscheds(dtestart, dteend) if _scheds is None else _scheds
 
     # return characteristics of the underlying in relation to option expiry
-    underrtn = optopt.underlying(_group='option', _idx=idx['idx'], _rtn=rtn.df['rtn'], _tdays=extdays, _scheds=[exschedmon, exschedwed, exschedfri])
+    underrtn = optopt.underlying(_group='option', _idx=idx['idx'], _rtn=rtn.df['rtn'], _tdays=extdays, _scheds=exscheds)
     underrtn.setmeasures()
     underrtn.setdescribe(_quantiles=quants)
+    underrtn.setdescribepaths(_quantiles=quants)
 
-    # gather components and write to .xlsx
-    optdata.writexlsx(_file=under.getpath()
-        , _group=[f'{underrtn.getgrp()}desc', f'{runner.getgrp()}desc', under.getgrp(), rtn.getgrp(), runner.getgrp(), underrtn.getgrp()]
-        , _df=[underrtn.dfdesc, runner.dfdesc, under.getdf(), rtn.getdf(), runner.getdf(), underrtn.getdf()]
-        , _prd=[obsout, obsout, obsout, obsout, obsout, obsout])
+    # gather components and write to .xlsx, or a bundle per REPORT
+    optdata.writereport(_file=under.getpath()
+        , _group=[f'{underrtn.getgrp()}desc', f'{underrtn.getgrp()}pathdesc', f'{runner.getgrp()}desc', under.getgrp(), rtn.getgrp(), runner.getgrp(), underrtn.getgrp()]
+        , _df=[underrtn.dfdesc, underrtn.dfpathdesc, runner.dfdesc, under.getdf(), rtn.getdf(), runner.getdf(), underrtn.getdf()]
+        , _prd=[obsout, obsout, obsout, obsout, obsout, obsout, obsout], _format=REPORT)
     return
 
+class stream(object):
+    '''
+    desc:   main kept running, one bar at a time. the history runs through main's batch
+            steps once, then update carries idx, rtn features, runner and underlying
+            forward by one row per bar. polyfit refits its window on every bar and is left
+            to main, as are the describe tables and .xlsx
+    '''
+
+    def __init__(self, _df, _scheds=None, _horizon=366):
+        '''
+        desc:   _df the daily df of a symbol, _horizon days of schedules past its last bar,
+                underlying.update raises on a bar past them
+        '''
+        self.idx = opttime.getidx(_group='idx', _df=_df)
+        self.last = self.idx.iloc[-1].to_dict()
+        self.lastdate = self.idx.index[-1]
+
+        self.features = optmeas.featurestream(optmeas.getfeaturegraph(_group='rtn', _prds=[prd2, prd3, prd252]), _df)
+        rtn = pd.concat([self.idx, self.features.getdf()], axis=1)
+
+        self.runner = optmeas.runner(_idx=self.idx['idx'], _rtn=rtn['rtn'], _group='runner')
+        self.runner.setrun()
+
+        dtestart = self.idx.index.min()
+        dteend = self.idx.index.max() + pd.Timedelta(days=_horizon)
+        extdays, exscheds = getscheds(dtestart, dteend) if _scheds is None else _scheds
+        self.underlying = optopt.underlying(_group='option', _idx=self.idx['idx'], _rtn=rtn['rtn'], _tdays=extdays, _scheds=exscheds)
+        self.underlying.setmeasures()
+        self.pending = []
+        self.dates = []
+        return
+
+    def getdf(self):
+        '''
+        desc:   idx and rtn features with the bars added by update, as main's rtn sheet
+        '''
+        if self.pending:
+            idx = pd.DataFrame(self.pending, index=pd.DatetimeIndex(self.dates))
+            idx.columns = pd.MultiIndex.from_tuples(idx.columns, names=["group", "var"])
+            self.idx = pd.concat([self.idx, idx])
+            self.pending = []
+            self.dates = []
+        return pd.concat([self.idx, self.features.getdf()], axis=1)
+
+    def update(self, _bar):
+        '''
+        desc:   add one bar, a row of the daily df (open, high, low, close, adjclose) named by its date
+        '''
+        self.last = opttime.getidxbar('idx', _bar.name, self.lastdate, self.last)
+        self.lastdate = _bar.name
+        self.pending.append(self.last)
+        self.dates.append(_bar.name)
+        features = self.features.update(_bar)
+        rtn = pd.Series({var: value for (group, var), value in features.items()}, name=_bar.name)
+        return {'idx': self.last, 'rtn': features, 'runner': self.runner.update(rtn), 'option': self.underlying.update(rtn)}
+
+def getstream(_symbol=SYMBOL, _path=PATHDATA, _scheds=None):
+    '''
+    desc:   stream of a symbol from its daily history, as main loads it
+    '''
+    under = optinst.stock(_dataprovider=optdata.yahoofin(), _symbol=_symbol, _region='US', _path=_path)
+    under.refreshdaily(_interval='1d', _obsin=f'{obsin}d', _events='div,split', _scale=1.0)
+    under.setidx()
+    return stream(under.df[under.symbol], _scheds=_scheds)
+
+def runsymbol(_symbol, _path):
+    '''
+    desc:   main for one symbol of a universe, returns timing and failure
+    '''
+    start = time.time()
+    try:
+        main(_symbol=_symbol, _path=_path, _scheds=SCHEDS)
+        error = None
+    except Exception as e:
+        error = repr(e)
+    return {'symbol':_symbol, 'seconds':time.time() - start, 'error':error}
+
+def universe(_symbols, _path=PATHDATA, _workers=WORKERS):
+    '''
+    desc:   run main for each symbol across a process pool
+            exchange holidays and expiry schedules are set once, for the range
+            of obsin up to today, and shared by the workers
+            writes a summary of per symbol timing and failures
+    '''
+    dteend = pd.Timestamp.today().normalize()
+    dtestart = dteend - pd.Timedelta(days=obsin*7//5 + 14)
+    extdays, exscheds = getscheds(dtestart, dteend)
+    for sched in [extdays] + exscheds: sched.setsched('option')
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        setscheds((extdays, exscheds))
+        pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool = ProcessPoolExecutor(max_workers=_workers, initializer=setscheds, initargs=((extdays, exscheds),))
+    with pool:
+        summary = pd.DataFrame(list(pool.map(runsymbol, _symbols, [_path]*len(_symbols)))).set_index('symbol')
+
+    file = f'{_path}universe-{dteend.date()}.csv'
+    summary.to_csv(file)
+    print(summary)
+    print(f'universe success {summary.error.isnull().sum()} of {summary.shape[0]}, summary {file}')
+    return summary
+
 if __name__ == "__main__":
     '''
-    SYMBOL = sys.argv[1]
-    PATHDATA = sys.argv[2]
+    python opteq.py SYMBOL[,SYMBOL...] [PATHDATA] [WORKERS]
     '''
-    main()
+    symbols = sys.argv[1].split(',') if len(sys.argv) > 1 else [SYMBOL]
+    path = sys.argv[2] if len(sys.argv) > 2 else PATHDATA
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else WORKERS
+    if len(symbols) == 1:
+        main(_symbol=symbols[0], _path=path)
+    else:
+        universe(symbols, path, workers)
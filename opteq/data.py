@@ -5,29 +5,138 @@
 # ####################################
 
 
+import numpy as np
 import pandas as pd
-import requests
+import asyncio
+import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+class csvstore(object):
+    '''
+    desc:   daily df as {path}{provider}-{symbol}.csv
+            appended rows go to the end of the file
+    '''
+    TYPEMAP = {'open':'float64','high':'float64','low':'float64','close':'float64','adjclose':'float64', 'volume':'int'}
+
+    def getfile(self, _provider, _symbol, _path):
+        return f'{_path}{_provider}-{_symbol}.csv'
+
+    def write(self, _df, _file):
+        _df.to_csv(_file)
+        return
+
+    def append(self, _df, _file):
+        _df.to_csv(_file, mode='a', header=not os.path.exists(_file))
+        return
+
+    def read(self, _file, _parsedates=None):
+        df = pd.read_csv(_file, index_col=0, dtype=self.TYPEMAP, parse_dates=_parsedates)
+        df.index = pd.DatetimeIndex(df.index)
+        return df
+
+class npystore(object):
+    '''
+    desc:   daily df as one .npy per column in {path}{provider}-{symbol}/
+            the index is int64 nanoseconds, columns are read memory mapped
+            append rewrites the columns, a date appended again supersedes the earlier row
+    '''
+    INDEX = '_index'
+
+    def getfile(self, _provider, _symbol, _path):
+        return f'{_path}{_provider}-{_symbol}'
+
+    def write(self, _df, _file):
+        os.makedirs(_file, exist_ok=True)
+        np.save(os.path.join(_file, f'{self.INDEX}.npy'), _df.index.values.astype('datetime64[ns]').view('int64'))
+        for column in _df.columns:
+            np.save(os.path.join(_file, f'{column}.npy'), _df[column].to_numpy())
+        with open(os.path.join(_file, 'columns'), 'w') as file:
+            file.write('\n'.join(_df.columns))
+        return
+
+    def append(self, _df, _file):
+        if os.path.exists(_file):
+            _df = pd.concat([self.read(_file), _df.reindex(columns=self.getcolumns(_file))])
+            _df = _df[~_df.index.duplicated(keep='last')]
+        self.write(_df, _file)
+        return
+
+    def getcolumns(self, _file):
+        with open(os.path.join(_file, 'columns')) as file:
+            return file.read().split('\n')
+
+    def read(self, _file, _parsedates=None):
+        index = np.load(os.path.join(_file, f'{self.INDEX}.npy'), mmap_mode='r')
+        index = pd.DatetimeIndex(np.asarray(index).view('datetime64[ns]'))
+        return pd.DataFrame({column: np.load(os.path.join(_file, f'{column}.npy'), mmap_mode='r')
+            for column in self.getcolumns(_file)}, index=index)
+
+class parquetstore(object):
+    '''
+    desc:   daily df as {path}{provider}-{symbol}.parquet, needs pyarrow (requirements-optional.txt) or fastparquet
+            append rewrites the file, a date appended again supersedes the earlier row
+    '''
+    def getfile(self, _provider, _symbol, _path):
+        return f'{_path}{_provider}-{_symbol}.parquet'
+
+    def write(self, _df, _file):
+        _df.to_parquet(_file)
+        return
+
+    def append(self, _df, _file):
+        if os.path.exists(_file):
+            _df = pd.concat([self.read(_file), _df])
+            _df = _df[~_df.index.duplicated(keep='last')]
+        self.write(_df, _file)
+        return
+
+    def read(self, _file, _parsedates=None):
+        df = pd.read_parquet(_file)
+        df.index = pd.DatetimeIndex(df.index)
+        return df
 
 class yahoofin(object):
     PROVIDER = 'yahoofin'
-    HOST_URL = None
+    HOST_URL = 'https://yfapi.net'
     PARSEDATES = None
     TOKEN = os.environ.get('YAHOOFIN_TOKEN')
+    TIMEOUT = 30
+    RETRIES = 4
+    BACKOFF = 0.5
 
-    def __init__(self):
+    def __init__(self, _hosturl=None, _store=None):
+        if _hosturl is not None:
+            self.HOST_URL = _hosturl
+        self.store = csvstore() if _store is None else _store
+        self.session = None
         return
 
-    def getdaily(self, _symbol='^GSPC', _region='US', _interval='1d', _obsin='252d', _events='div,split', _scale=1.0):
+    def newsession(self, _poolsize=10):
         '''
-        endppoint:  chart (OHLC)
-        desc:       get historical daily data
-                    close is adjusted for splits
-                    adjclose is adjusted for splits and dividends
-                    close and adjclose include extended trading hours
+        desc:       http session with a connection pool of _poolsize
+        '''
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=_poolsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def getsession(self, _poolsize=10):
+        '''
+        desc:       pooled http session, reused across requests
+        '''
+        if self.session is None:
+            self.session = self.newsession(_poolsize)
+        return self.session
+
+    def getrequest(self, _symbol, _region, _interval, _obsin, _events):
+        '''
+        endpoint:   chart (OHLC)
+        desc:       url, headers and params of a daily data request
         '''
-        base_url = 'https://yfapi.net/v8/finance'
-        endpoint = f'{base_url}/chart/{_symbol}'
+        endpoint = f'{self.HOST_URL}/v8/finance/chart/{_symbol}'
         headers = {
                     'x-api-key': self.TOKEN
                     }
@@ -36,18 +145,37 @@ class yahoofin(object):
                     ,"interval":_interval
                     ,"events":_events
                     }
+        return endpoint, headers, params
 
-        try:
-            resp = requests.get(endpoint, headers=headers, params=params)
+    def parsedaily(self, _payload, _scale=1.0):
+        '''
+        desc:       daily df from a parsed chart payload
+        '''
+        result = _payload['chart']['result'][0]
 
-            # create DatetimeIndex
-            idx = pd.to_datetime(resp.json()['chart']['result'][0]['timestamp'], errors='raise', unit='s', origin='unix').date
+        # create DatetimeIndex
+        idx = pd.to_datetime(result['timestamp'], errors='raise', unit='s', origin='unix').date
 
-            data = pd.DataFrame(resp.json()['chart']['result'][0]['indicators']['quote'][0], index=idx)
-            dataadj = pd.DataFrame(resp.json()['chart']['result'][0]['indicators']['adjclose'][0], index=idx)
-            df = pd.concat([_scale*data, _scale*dataadj], axis=1)
+        data = pd.DataFrame(result['indicators']['quote'][0], index=idx)
+        dataadj = pd.DataFrame(result['indicators']['adjclose'][0], index=idx)
+        df = pd.concat([_scale*data, _scale*dataadj], axis=1)
 
-            df.index = pd.DatetimeIndex(df.index)
+        df.index = pd.DatetimeIndex(df.index)
+        return df
+
+    def getdaily(self, _symbol='^GSPC', _region='US', _interval='1d', _obsin='252d', _events='div,split', _scale=1.0):
+        '''
+        endppoint:  chart (OHLC)
+        desc:       get historical daily data
+                    close is adjusted for splits
+                    adjclose is adjusted for splits and dividends
+                    close and adjclose include extended trading hours
+        '''
+        endpoint, headers, params = self.getrequest(_symbol, _region, _interval, _obsin, _events)
+
+        try:
+            resp = self.getsession().get(endpoint, headers=headers, params=params, timeout=self.TIMEOUT)
+            df = self.parsedaily(resp.json(), _scale)
             print("data.yahoofin.getdaily df success")
 
         except:
@@ -56,28 +184,104 @@ class yahoofin(object):
         finally:
             return df
 
+    async def agetdaily(self, _sessions, _symbol, _region, _interval, _obsin, _events, _scale):
+        '''
+        desc:       getdaily for one symbol of a batch
+                    the request runs in a worker thread on a session taken from the
+                    queue _sessions, no two threads share a requests.Session
+                    429 and 5xx responses are retried with exponential backoff,
+                    or after Retry-After when the server sends it
+        '''
+        endpoint, headers, params = self.getrequest(_symbol, _region, _interval, _obsin, _events)
+        df = None
+        session = await _sessions.get()
+        try:
+            for attempt in range(self.RETRIES + 1):
+                resp = await asyncio.to_thread(session.get, endpoint, headers=headers, params=params, timeout=self.TIMEOUT)
+                if (resp.status_code == 429 or resp.status_code >= 500) and attempt < self.RETRIES:
+                    wait = resp.headers.get('Retry-After', '')
+                    await asyncio.sleep(float(wait) if wait.isdigit() else self.BACKOFF*2**attempt)
+                    continue
+                resp.raise_for_status()
+                df = self.parsedaily(resp.json(), _scale)
+                break
+            print(f"data.yahoofin.getdailies df success {_symbol}")
+        except Exception as e:
+            print(f"data.yahoofin.getdailies failed {_symbol}")
+            print(e)
+        finally:
+            _sessions.put_nowait(session)
+        return df
+
+    async def agetdailies(self, _symbols, _region='US', _interval='1d', _obsin='252d', _events='div,split', _scale=1.0, _concurrency=8):
+        '''
+        desc:       getdailies as a coroutine, to await from a running event loop
+                    _concurrency sessions, one per request in flight
+        '''
+        sessions = asyncio.Queue()
+        for worker in range(min(_concurrency, len(_symbols)) or 1):
+            sessions.put_nowait(self.newsession(_poolsize=1))
+        start = time.time()
+        try:
+            dfs = await asyncio.gather(*[self.agetdaily(sessions, symbol, _region, _interval, _obsin, _events, _scale) for symbol in _symbols])
+        finally:
+            while not sessions.empty():
+                sessions.get_nowait().close()
+        dfs = dict(zip(_symbols, dfs))
+        print(f"data.yahoofin.getdailies {sum(df is not None for df in dfs.values())} of {len(dfs)} in {time.time() - start:.1f}s")
+        return dfs
+
+    def getdailies(self, _symbols, _region='US', _interval='1d', _obsin='252d', _events='div,split', _scale=1.0, _concurrency=8):
+        '''
+        desc:       getdaily for many symbols concurrently
+                    at most _concurrency requests are in flight
+                    returns dict of symbol to df, df is None on failure
+                    called from a running event loop (jupyter) the batch runs on a
+                    loop of its own in a thread, await agetdailies there instead
+        '''
+        coroutine = self.agetdailies(_symbols, _region, _interval, _obsin, _events, _scale, _concurrency)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coroutine).result()
+
     def writedaily(self, _df, _symbol='^GSPC', _path='py/equity/data/'):
         '''
         desc:       write daily df to files
         '''
         try:
-            file = f'{_path}{self.PROVIDER}-{_symbol}.csv'
-            _df.to_csv(file)
+            file = self.store.getfile(self.PROVIDER, _symbol, _path)
+            self.store.write(_df, file)
             print("data.yahoofin.write success ", file)
         except:
             print("data.yahoofin.write failed", file)
         finally:
             return
 
+    def appenddaily(self, _df, _symbol='^GSPC', _path='py/equity/data/'):
+        '''
+        desc:       append daily df rows to file
+                    a date appended again supersedes the earlier row on read
+        '''
+        try:
+            file = self.store.getfile(self.PROVIDER, _symbol, _path)
+            self.store.append(_df, file)
+            print("data.yahoofin.append success ", file)
+        except:
+            print("data.yahoofin.append failed", file)
+        finally:
+            return
+
     def readdaily(self, _symbol='^GSPC', _path='py/equity/data/', _parsedates=PARSEDATES):
         '''
-        desc:       read csv of daily data to df
+        desc:       read daily data to df
         '''
         try:
-            typemap = {'open':'float64','high':'float64','low':'float64','close':'float64','adjclose':'float64', 'volume':'int'}
-            file = f'{_path}{self.PROVIDER}-{_symbol}.csv'
-            df = pd.read_csv(file, index_col=0, dtype=typemap, parse_dates=_parsedates)
-            df.index = pd.DatetimeIndex(df.index)
+            file = self.store.getfile(self.PROVIDER, _symbol, _path)
+            df = self.store.read(file, _parsedates)
+            df = df[~df.index.duplicated(keep='last')]
             print("data.yahoofin.readdf success ", file)
         except:
             df = None
@@ -85,21 +289,150 @@ class yahoofin(object):
         finally:
             return df
 
-def writexlsx(_file, _group, _df, _prd):
+    def migratedaily(self, _symbol='^GSPC', _path='py/equity/data/', _store=None):
+        '''
+        desc:       copy the daily data of _store, default the csv files, into this store
+        '''
+        try:
+            store = csvstore() if _store is None else _store
+            df = store.read(store.getfile(self.PROVIDER, _symbol, _path))
+            df = df[~df.index.duplicated(keep='last')]
+            self.store.write(df, self.store.getfile(self.PROVIDER, _symbol, _path))
+            print("data.yahoofin.migrate success ", _symbol)
+        except Exception as e:
+            print("data.yahoofin.migrate failed ", _symbol)
+            print(e)
+        finally:
+            return
+
+def getcell(_value):
+    '''
+    desc:   a label or value as a cell, nan is blank, inf is text, dates are datetimes
+    '''
+    if isinstance(_value, tuple):
+        return str(_value)
+    if _value is None or (np.ndim(_value) == 0 and pd.isna(_value)):
+        return None
+    if isinstance(_value, pd.Timestamp):
+        return _value.to_pydatetime()
+    if isinstance(_value, (float, np.floating)) and np.isinf(_value):
+        return 'inf' if _value > 0 else '-inf'
+    if isinstance(_value, np.generic):
+        return _value.item()
+    return _value
+
+def getcells(_values):
+    '''
+    desc:   a column as an object array of cells, vectorised for float, int and date columns
+    '''
+    values = pd.Series(_values, copy=False)
+    if values.dtype.kind == 'M':
+        cells = np.array(pd.DatetimeIndex(values).to_pydatetime(), dtype=object)
+        cells[values.isna().to_numpy()] = None
+    elif values.dtype.kind == 'f':
+        numbers = values.to_numpy()
+        cells = numbers.astype(object)
+        cells[np.isnan(numbers)] = None
+        cells[np.isposinf(numbers)] = 'inf'
+        cells[np.isneginf(numbers)] = '-inf'
+    elif values.dtype.kind in 'iub':
+        cells = values.to_numpy().astype(object)
+    else:
+        cells = np.array([getcell(value) for value in values], dtype=object)
+    return cells
+
+def getsheetrows(_df):
+    '''
+    desc:   rows of a sheet as to_excel lays them out, a row for each level of the columns
+            and, below a column multiindex, a row of index names, then the index and values
+            of each row. repeated labels are written to every cell, not merged
+    '''
+    nidx = _df.index.nlevels
+    if isinstance(_df.columns, pd.MultiIndex):
+        for level in range(_df.columns.nlevels):
+            yield [None]*(nidx - 1) + [getcell(label) for label in [_df.columns.names[level]] + list(_df.columns.get_level_values(level))]
+        yield [getcell(label) for label in _df.index.names]
+    else:
+        yield [getcell(label) for label in list(_df.index.names) + list(_df.columns)]
+    columns = [getcells(_df.index.get_level_values(level)) for level in range(nidx)]
+    columns += [getcells(_df.iloc[:, column]) for column in range(_df.shape[1])]
+    yield from zip(*columns)
+
+def writexlsx(_file, _group, _df, _prd, _engine=None):
     '''
-    desc:   write df and measures to files
+    desc:   write df and measures to files, the last _prd rows of each df to the sheet _group
+            rows are streamed to the file, xlsxwriter in constant_memory mode or, without
+            xlsxwriter, an openpyxl write_only workbook. one workbook is written in order,
+            sheet after sheet
     '''
     try:
-        options = {}
-        options['strings_to_formulas'] = False
-        options['strings_to_urls'] = False
+        if _engine is None:
+            try:
+                import xlsxwriter
+                _engine = 'xlsxwriter'
+            except ImportError:
+                _engine = 'openpyxl'
 
-        with pd.ExcelWriter(_file, engine='openpyxl', mode='wb', options=options) as writer:
+        if _engine == 'xlsxwriter':
+            import xlsxwriter
+            options = {'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False
+                , 'strings_to_numbers': False, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'}
+            workbook = xlsxwriter.Workbook(_file, options)
             for group, df, prd in zip(_group, _df, _prd):
-                prd = min(prd, df.shape[0])
-                df.tail(prd).to_excel(writer, sheet_name=group)
+                worksheet = workbook.add_worksheet(group)
+                for row, cells in enumerate(getsheetrows(df.tail(min(prd, df.shape[0])))):
+                    worksheet.write_row(row, 0, cells)
+            workbook.close()
+        else:
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            for group, df, prd in zip(_group, _df, _prd):
+                worksheet = workbook.create_sheet(group)
+                for cells in getsheetrows(df.tail(min(prd, df.shape[0]))):
+                    worksheet.append(list(cells))
+            workbook.save(_file)
         print("writexlsx success ", _file)
-    except:
+    except Exception as e:
         print("writexlsx failed", _file)
+        print(e)
+    finally:
+        return
+
+def writebundle(_path, _group, _df, _prd, _format='parquet', _workers=None):
+    '''
+    desc:   the sheets of writexlsx as one file per group in the directory _path,
+            {group}.parquet (needs pyarrow or fastparquet) or {group}.csv, written by a
+            thread pool. parquet takes string labels, other labels are written as strings
+    '''
+    def write(_group, _df, _prd):
+        df = _df.tail(min(_prd, _df.shape[0]))
+        if _format == 'parquet':
+            if isinstance(df.columns, pd.MultiIndex):
+                df = df.set_axis(df.columns.set_levels([level.map(str) for level in df.columns.levels]), axis=1)
+            else:
+                df = df.set_axis(df.columns.map(str), axis=1)
+            df.to_parquet(os.path.join(_path, f'{_group}.parquet'))
+        else:
+            df.to_csv(os.path.join(_path, f'{_group}.csv'))
+        return
+
+    try:
+        os.makedirs(_path, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=_workers) as pool:
+            list(pool.map(write, _group, _df, _prd))
+        print("writebundle success ", _path)
+    except Exception as e:
+        print("writebundle failed", _path)
+        print(e)
     finally:
         return
+
+def writereport(_file, _group, _df, _prd, _format='xlsx'):
+    '''
+    desc:   writexlsx to _file, or writebundle to _file without its .xlsx for parquet, csv
+    '''
+    if _format == 'xlsx':
+        writexlsx(_file, _group, _df, _prd)
+    else:
+        writebundle(os.path.splitext(_file)[0], _group, _df, _prd, _format=_format)
+    return
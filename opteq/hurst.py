@@ -11,7 +11,9 @@ __version__ = '0.0.5'
 import sys
 import math
 import warnings
+from collections import deque
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 try:
     import pandas as pd
 except:
@@ -85,6 +87,34 @@ class hurst(object):
             return 0  # return 0 to skip this interval due undefined R/S
         return R / S
 
+    def __get_rolling_RS(self, _series, _pcts, _w):
+        '''
+        desc:   rescaled range of every chunk of length _w, one per start position
+        series: np.ndarray of observations
+        pcts:   np.ndarray of series pct changes when kind is 'price'
+        w:      chunk length
+        '''
+        if self.kind == 'price':
+            incs = sliding_window_view(_pcts, _w - 1)
+        elif self.kind == 'change':
+            incs = sliding_window_view(_series, _w)
+        S = np.std(incs, axis=1, ddof=1)
+
+        if self.simplified and self.kind == 'price':
+            chunks = sliding_window_view(_series, _w)
+            R = np.max(chunks, axis=1) / np.min(chunks, axis=1) - 1.
+        elif self.simplified and self.kind == 'change':
+            Z = np.cumsum(incs, axis=1)
+            R = np.maximum(np.max(Z, axis=1), 0.) - np.minimum(np.min(Z, axis=1), 0.)
+        else:
+            mean_inc = np.sum(incs, axis=1) / incs.shape[1]
+            Z = np.cumsum(incs - mean_inc[:, None], axis=1)
+            R = np.max(Z, axis=1) - np.min(Z, axis=1)
+
+        RS = R / S
+        RS[(R == 0) | (S == 0)] = 0  # 0 to skip this interval due undefined R/S
+        return RS
+
     def setwindows(self):
         '''
         desc:   set windows
@@ -154,3 +184,210 @@ class hurst(object):
         c = 10**c
         #return H, c, [window_sizes, RS]
         return H
+
+    def getrolling(self, _series, _prd, _block=1024):
+        '''
+        desc:    rolling H over windows of _prd observations
+                 same as _series.rolling(_prd).apply(self.gethurst) but R/S is computed
+                 once per chunk start for every window size, then averaged per window
+                 with array operations
+        series:  array-like (Time-)series
+        prd:     window length
+        block:   windows per batch, bounds memory
+        returns: np.ndarray of H aligned to series, nan for incomplete windows or windows with nans
+        '''
+        series = np.asarray(_series, dtype=float)
+        H = np.full(series.shape[0], np.nan)
+        if series.shape[0] < _prd:
+            return H
+
+        self.serieslen = _prd
+        if self.serieslen < self.maxwindow:
+            self.maxwindow = min([self.maxwindow, self.serieslen-1])
+            print(f'Max window > series length. Max window set to series length')
+        self.setwindows()
+
+        # H is the slope of log10(RS) on log10(windowsizes), same for all windows
+        x = np.log10(self.windowsizes)
+        x = x - x.mean()
+
+        err = np.seterr(divide='ignore', invalid='ignore')
+        pcts = series[1:] / series[:-1] - 1. if self.kind == 'price' else None
+
+        nwindows = series.shape[0] - _prd + 1
+        for start in range(0, nwindows, _block):
+            end = min(start + _block, nwindows)
+            chunk = series[start:end + _prd - 1]
+            chunkpcts = pcts[start:end + _prd - 2] if self.kind == 'price' else None
+
+            RS = np.empty((end - start, len(self.windowsizes)))
+            for i, w in enumerate(self.windowsizes):
+                rs = self.__get_rolling_RS(chunk, chunkpcts, w)
+                rs = rs[np.arange(end - start)[:, None] + w*np.arange(_prd // w)[None, :]]
+                keep = rs != 0
+                RS[:, i] = np.sum(np.where(keep, rs, 0.), axis=1) / np.sum(keep, axis=1)
+
+            H[start + _prd - 1:end + _prd - 1] = np.dot(np.log10(RS), x) / np.dot(x, x)
+        np.seterr(**err)
+
+        # windows containing nans are not computed by rolling
+        nans = np.concatenate([[0], np.cumsum(np.isnan(series))])
+        H[_prd - 1:][(nans[_prd:] - nans[:-_prd]) > 0] = np.nan
+        return H
+
+
+class hurstonline(hurst):
+    '''
+    desc: online hurst exponent over a trailing window of _prd observations
+          each window size keeps the R/S of every chunk start, so a new observation
+          completes one chunk per window size and moves the window's chunk average
+          by one add and one expire
+          simplified chunks use running sums, sums of squares and monotonic deques
+          for the extrema. non-simplified chunks rescan the new chunk, O(window size),
+          as the mean adjusted cumulative deviation has no running update
+    '''
+    def __init__(self, _prd, _kind='price', _simplified=False, _minwindow=3, _maxwindow=5*13):
+        super().__init__(_kind, _simplified, _minwindow, _maxwindow)
+        self.prd = _prd
+        self.serieslen = _prd
+        if self.serieslen < self.maxwindow:
+            self.maxwindow = min([self.maxwindow, self.serieslen-1])
+            print(f'Max window > series length. Max window set to series length')
+        self.setwindows()
+
+        # H is the slope of log10(RS) on log10(windowsizes)
+        self.x = np.log10(self.windowsizes)
+        self.x = self.x - self.x.mean()
+        self.reset()
+        return
+
+    def reset(self):
+        '''
+        desc:   clear state, the next _prd observations refill the window
+        '''
+        self.obs = 0
+        self.series = []
+        self.incs = []
+        self.prefix = []
+        self.chunks = []
+        for w in self.windowsizes:
+            self.chunks.append({'w':w
+                , 'k':self.prd // w
+                , 'n':w - 1 if self.kind == 'price' else w
+                , 'sum':0.
+                , 'sumsq':0.
+                , 'max':deque()
+                , 'min':deque()
+                , 'rs':np.zeros(self.prd + 1)
+                , 'rssum':np.zeros(w)
+                , 'rscnt':np.zeros(w, dtype=int)})
+        return
+
+    def __get_chunk_RS(self, _chunk, _t):
+        '''
+        desc:   rescaled range of the chunk ending at observation _t
+        '''
+        n = _chunk['n']
+        if self.simplified:
+            mean_inc = _chunk['sum'] / n
+            S = math.sqrt(max((_chunk['sumsq'] - _chunk['sum']*mean_inc) / (n - 1), 0.))
+            if self.kind == 'price':
+                R = _chunk['max'][0][1] / _chunk['min'][0][1] - 1.
+            elif self.kind == 'change':
+                base = self.prefix[-_chunk['w']-1] if _t >= _chunk['w'] else 0.
+                R = max(_chunk['max'][0][1] - base, 0.) - min(_chunk['min'][0][1] - base, 0.)
+        else:
+            incs = np.array(self.incs[-n:])
+            Z = np.cumsum(incs - np.sum(incs) / n)
+            R = np.max(Z) - np.min(Z)
+            S = np.std(incs, ddof=1)
+
+        if R == 0 or S == 0:
+            return 0  # return 0 to skip this interval due undefined R/S
+        return R / S
+
+    def __set_extrema(self, _chunk, _t, _value):
+        '''
+        desc:   push _value into the chunk's monotonic max/min deques
+        '''
+        qmax, qmin = _chunk['max'], _chunk['min']
+        while qmax and qmax[-1][1] <= _value:
+            qmax.pop()
+        while qmin and qmin[-1][1] >= _value:
+            qmin.pop()
+        qmax.append((_t, _value))
+        qmin.append((_t, _value))
+        while qmax[0][0] <= _t - _chunk['w']:
+            qmax.popleft()
+        while qmin[0][0] <= _t - _chunk['w']:
+            qmin.popleft()
+        return
+
+    def update(self, _value):
+        '''
+        desc:    append one observation
+        returns: H of the trailing _prd observations, nan until the window is full
+        '''
+        if np.isnan(_value):
+            self.reset()
+            return np.nan
+
+        t = self.obs
+        if self.kind == 'price' and t > 0:
+            self.incs.append(_value / self.series[-1] - 1.)
+        elif self.kind == 'change':
+            self.incs.append(_value)
+        self.series.append(_value)
+        if self.kind == 'change':
+            self.prefix.append((self.prefix[-1] if self.prefix else 0.) + _value)
+
+        RS = np.empty(len(self.chunks))
+        for i, chunk in enumerate(self.chunks):
+            w, k, n = chunk['w'], chunk['k'], chunk['n']
+
+            if self.simplified:
+                if self.kind == 'change' or t > 0:
+                    chunk['sum'] += self.incs[-1]
+                    chunk['sumsq'] += self.incs[-1]**2
+                    if len(self.incs) > n:
+                        chunk['sum'] -= self.incs[-n-1]
+                        chunk['sumsq'] -= self.incs[-n-1]**2
+                self.__set_extrema(chunk, t, _value if self.kind == 'price' else self.prefix[-1])
+
+            # chunk starting at t - w + 1 is complete
+            if t >= w - 1:
+                chunk['rs'][(t - w + 1) % chunk['rs'].shape[0]] = self.__get_chunk_RS(chunk, t)
+
+            # window starting at s averages chunks s, s + w, ..., s + (k-1)w
+            if t >= self.prd - 1:
+                s = t - self.prd + 1
+                c = s % w
+                rs = chunk['rs']
+                if s < w:
+                    chunkrs = rs[[(s + j*w) % rs.shape[0] for j in range(k)]]
+                    chunk['rssum'][c] = np.sum(chunkrs[chunkrs != 0])
+                    chunk['rscnt'][c] = np.sum(chunkrs != 0)
+                else:
+                    for p, sign in ((s + (k-1)*w, 1), (s - w, -1)):
+                        if rs[p % rs.shape[0]] != 0:
+                            chunk['rssum'][c] += sign*rs[p % rs.shape[0]]
+                            chunk['rscnt'][c] += sign
+                RS[i] = chunk['rssum'][c] / chunk['rscnt'][c] if chunk['rscnt'][c] > 0 else np.nan
+
+        # keep enough history for the largest chunk and its expiring increment
+        if len(self.series) > 2*(self.prd + 1):
+            del self.series[:-(self.prd + 1)]
+            del self.incs[:-(self.prd + 1)]
+            del self.prefix[:-(self.prd + 1)]
+
+        self.obs += 1
+        if t < self.prd - 1:
+            return np.nan
+        return np.dot(np.log10(RS), self.x) / np.dot(self.x, self.x)
+
+    def extend(self, _series):
+        '''
+        desc:    append observations in order
+        returns: np.ndarray of H, one per observation
+        '''
+        return np.array([self.update(value) for value in np.asarray(_series, dtype=float)])
@@ -6,14 +6,11 @@
 
 
 import opteq.data as optdata
-import opteq.measures as optmeas
 import opteq.time as opttime
 
 import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
 
-import requests
 import os
 
 PATHREL = 'opteq/data/'
@@ -58,6 +55,67 @@ class instrument:
         self.df = self.df.ffill()
         return
 
+    def refreshdaily(self, _interval='1d', _obsin='252d', _events='div,split', _scale=1.0, _overlap=5):
+        '''
+        desc:  read cached daily data and append the bars after the last cached date
+               the last _overlap days are fetched again to catch revisions of the last bar
+               a restated close or adjclose on an earlier bar, from a split or dividend,
+               downloads and writes the _obsin history again
+               df keeps the _obsin window (days, as '1040d'), the file is written again
+               without the older bars once they are a quarter of it, appended to until then
+        '''
+        cached = self.dataprovider.readdaily(self.symbol, self.path)
+        if cached is None or cached.empty:
+            self.getdaily(_interval=_interval, _obsin=_obsin, _events=_events, _scale=_scale)
+            self.writedaily()
+            return
+
+        last = cached.index.max()
+        delta = self.dataprovider.getdaily(_symbol = self.symbol
+            , _region = self.region
+            , _interval = _interval
+            , _obsin = f'{(pd.Timestamp.today().normalize() - last).days + _overlap}d'
+            , _events = _events
+            , _scale = _scale)
+        if delta is None:
+            print(f'instrument.refreshdaily failed {self.symbol}, using cached data')
+            self.df = cached
+            return
+        delta = delta.reindex(columns=cached.columns)
+
+        # restated adjusted history
+        overlap = delta.index.intersection(cached.index[cached.index < last])
+        adjusted = ['close', 'adjclose']
+        restated = (delta.loc[overlap, adjusted]/cached.loc[overlap, adjusted] - 1.).abs() > 1e-9
+        if restated.values.any():
+            print(f'instrument.refreshdaily restated history {self.symbol}, full download')
+            self.getdaily(_interval=_interval, _obsin=_obsin, _events=_events, _scale=_scale)
+            self.writedaily()
+            return
+
+        # append new bars and a revised last bar
+        self.df = pd.concat([cached, delta.loc[delta.index >= last]])
+        self.df = self.df[~self.df.index.duplicated(keep='last')].ffill()
+        new = self.df.loc[self.df.index >= last]
+        if (new.iloc[0] == cached.iloc[-1]).all():
+            new = new.iloc[1:]
+
+        # trim to the _obsin window, a range such as 'max' keeps everything
+        try:
+            start = pd.Timestamp.today().normalize() - pd.Timedelta(_obsin)
+        except ValueError:
+            start = self.df.index.min()
+        stale = int((self.df.index < start).sum())
+        self.df = self.df.loc[self.df.index >= start]
+        if stale > self.df.shape[0]//4:
+            self.writedaily()
+            print(f'instrument.refreshdaily success {self.symbol}, {new.shape[0]} bars appended, {stale} bars trimmed')
+            return
+        if not new.empty:
+            self.dataprovider.appenddaily(new, self.symbol, self.path)
+        print(f'instrument.refreshdaily success {self.symbol}, {new.shape[0]} bars appended')
+        return
+
     def getpath(self):
         '''
         desc:  get the file path and name
@@ -78,6 +136,14 @@ class instrument:
         self.df = self.dataprovider.readdaily(self.symbol, self.path)
         return
 
+    def readpanel(self, _panel):
+        '''
+        desc:  read df from a memory mapped panel, opteq.panel
+               the columns stay views of the maps through setidx
+        '''
+        self.df = _panel.getdf(self.symbol)
+        return
+
 class stock(instrument):
     '''
     desc:       equity timeseries
@@ -94,7 +160,14 @@ class stock(instrument):
         return
 
     def setidx(self):
-        self.df = self.df.reindex(columns=self.features)
+        '''
+        desc:   columns (symbol, feature). a df that has the features in order is not
+                copied, readpanel columns stay views of the panel
+        '''
+        if list(self.df.columns) == self.features:
+            self.df = self.df.copy(deep=False)
+        else:
+            self.df = self.df.reindex(columns=self.features)
         self.df.columns = [(self.symbol, column) for column in self.df.columns]
         self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
         return
@@ -8,14 +8,10 @@
 # ####################################
 
 
+import hashlib
+from collections import deque
 import numpy as np
 import pandas as pd
-import pandas_ta as ta
-
-import opteq.time as opttime
-import opteq.measures as optmeas
-import opteq.hurst as opthurst
-import opteq.polyfit as optfit
 #import ta
 
 class rtn:
@@ -26,15 +22,69 @@ class rtn:
     features = ['lnr','lnr^2','dir','lnlow','lnlow^2','lnhigh','lnhigh^2']
     drop = []
 
-    def __init__(self, _group='rtn',_periods=[13*5, 26*5, 52*5]):
+    def __init__(self, _group='rtn',_periods=[13*5, 26*5, 52*5], _columnar=False, _capacity=32):
         self.group = _group
         self.periods = _periods
         self.df = pd.DataFrame()
+        self.hursts = {}
+        # columnar mode writes new columns into one column major buffer keyed by (group, var)
+        # and builds the multiindex df from it once in getdf
+        self.columnar = _columnar
+        self.capacity = _capacity
+        self.columns = {}
+        self.values = None
+        self.index = None
         return
 
     def getdf(self):
+        '''
+        desc:   in columnar mode the pending columns are wrapped into self.df without a copy
+        '''
+        if self.columns:
+            df = pd.DataFrame(self.values[:, :len(self.columns)], index=self.index, columns=pd.MultiIndex.from_tuples(self.columns, names=["group", "var"]), copy=False)
+            if self.df.empty:
+                self.df = df
+            else:
+                self.df = pd.concat([self.df.drop(columns=[column for column in self.columns if column in self.df.columns]), df], axis=1)
+            self.columns = {}
+            self.values = None
         return self.df
 
+    def getcolumn(self, _group, _var):
+        '''
+        desc:   a column as a series, pending or built
+        '''
+        if (_group,_var) in self.columns:
+            return pd.Series(self.values[:, self.columns[(_group,_var)]], index=self.index, name=(_group,_var), copy=False)
+        return self.df[(_group,_var)]
+
+    def setcolumn(self, _group, _var, _feature):
+        '''
+        desc:   add a column, in columnar mode into the buffer aligned to the first column added
+        '''
+        if not self.columnar:
+            self.df[(_group,_var)] = _feature
+            return
+        if self.values is None:
+            if self.index is None:
+                self.index = self.df.index if not self.df.empty else _feature.index
+            self.values = np.empty((self.index.shape[0], self.capacity), order='F')
+        if isinstance(_feature, pd.Series) and not _feature.index.equals(self.index):
+            _feature = _feature.reindex(self.index)
+        if (_group,_var) not in self.columns:
+            if len(self.columns) == self.values.shape[1]:
+                values = np.empty((self.values.shape[0], 2*self.values.shape[1]), order='F')
+                values[:, :self.values.shape[1]] = self.values
+                self.values = values
+            self.columns[(_group,_var)] = len(self.columns)
+        self.values[:, self.columns[(_group,_var)]] = _feature
+        return
+
+    def setmultiindex(self):
+        if not self.columnar:
+            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+        return
+
     def getdfgrp(self, _grp):
         return self.df(_grp)[self.features]
 
@@ -47,12 +97,13 @@ class rtn:
                 p(t) = p(0)exp(r)
         '''
         try:
-            self.df[(_group,f'{_name}ln')] = pd.Series(np.log(_feature1) - np.log(_feature2.shift(_prd)), index=_feature1.index)
-            self.df[(_group,f'{_name}ln^2')] = self.df[(_group,f'{_name}ln')].pow(2)
+            self.setcolumn(_group, f'{_name}ln', pd.Series(np.log(_feature1) - np.log(_feature2.shift(_prd)), index=_feature1.index))
+            lnr = self.getcolumn(_group, f'{_name}ln')
+            self.setcolumn(_group, f'{_name}ln^2', lnr.pow(2))
 
-            self.df[(_group,f'{_name}dir')] = self.df[(_group,f'{_name}ln')]/self.df[(_group,f'{_name}ln')].abs()
+            self.setcolumn(_group, f'{_name}dir', lnr/lnr.abs())
 
-            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            self.setmultiindex()
             print(f'rtn.setrtn success with {_group}')
         except Exception as e:
             print(f'rtn.setrtn failed with {_group}')
@@ -63,15 +114,20 @@ class rtn:
     def setstats(self, _group, _feature, _prd):
         '''
         desc:   rolling min, mean, max
+                _prd an int or a list of periods, computed together by getrollingstats
         '''
         try:
-            self.df[(_group,f'{_feature}-mu-{_prd}')] = self.df[(_group,_feature)].rolling(_prd).mean()
-            min = self.df[(_group,_feature)].rolling(_prd).min()
-            max = self.df[(_group,_feature)].rolling(_prd).max()
+            feature = self.getcolumn(_group, _feature)
+            prds = [_prd] if np.ndim(_prd) == 0 else list(_prd)
+            stats = getrollingstats(feature.to_numpy(dtype=float), prds)
+            for prd in prds:
+                mean, min, max = stats[prd]
+                self.setcolumn(_group, f'{_feature}-mu-{prd}', pd.Series(mean, index=feature.index))
 
-            self.df[(_group,f'{_feature}-rank-{_prd}')] = (self.df[(_group,_feature)] - min)/(max - min)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    self.setcolumn(_group, f'{_feature}-rank-{prd}', pd.Series((feature.to_numpy(dtype=float) - min)/(max - min), index=feature.index))
 
-            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            self.setmultiindex()
             print(f'rtn.setstats success with {_group}')
         except Exception as e:
             print(f'rtn.setstats failed with {_group}')
@@ -82,12 +138,28 @@ class rtn:
     def sethurst(self, _group, _name, _feature, _prd, _kind='price', _simplified=False, _minwindow=3, _maxwindow=5*13):
         '''
         desc:   rolling hurst exponent
+                a repeat call extends the series with the bars after the last call
         '''
         try:
-            hurst = opthurst.hurst(_kind, _simplified, _minwindow, _maxwindow)
-            self.df[(_group,f'{_name}-hurst-{_prd}')] = _feature.rolling(_prd).apply(hurst.gethurst)
+            column = (_group,f'{_name}-hurst-{_prd}')
+            if column in self.hursts and column in self.getdf().columns:
+                online, last = self.hursts[column]
+                feature = _feature.loc[_feature.index > last]
+                self.df = self.df.reindex(self.df.index.union(feature.index))
+                self.df.loc[feature.index, column] = online.extend(feature.values)
+                if self.columnar:
+                    self.index = self.df.index
+            else:
+                import opteq.hurst as opthurst
+                hurst = opthurst.hurst(_kind, _simplified, _minwindow, _maxwindow)
+                self.setcolumn(*column, pd.Series(hurst.getrolling(_feature, _prd), index=_feature.index))
 
-            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+                # seed the online state with enough bars for every chunk of the last window
+                online = opthurst.hurstonline(_prd, _kind, _simplified, _minwindow, _maxwindow)
+                online.extend(_feature.tail(2*_prd).values)
+            self.hursts[column] = (online, _feature.index[-1])
+
+            self.setmultiindex()
             print(f'rtn.sethurst success with {_group}')
         except Exception as e:
             print(f'rtn.sethurst failed with {_group}')
@@ -100,10 +172,11 @@ class rtn:
         desc:   max(_feature1^2,_feature2^2)
         '''
         try:
-            self.df[(_group,_name)] = np.maximum(self.df[(_group,_feature1)],self.df[(_group,_feature2)])
-            self.df[(_group,f'{_name}ln')] = np.log(self.df[(_group,_name)]) - np.log(self.df[(_group,_name)].shift(1))
+            self.setcolumn(_group, _name, np.maximum(self.getcolumn(_group, _feature1), self.getcolumn(_group, _feature2)))
+            feature = self.getcolumn(_group, _name)
+            self.setcolumn(_group, f'{_name}ln', np.log(feature) - np.log(feature.shift(1)))
 
-            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            self.setmultiindex()
             print(f'rtn.setmax success with {_group}')
         except Exception as e:
             print(f'rtn.setmax failed with {_group}')
@@ -114,11 +187,16 @@ class rtn:
     def setrsi(self, _group, _name, _feature, _length=14):
         '''
         desc:   set the wilder rsi
+                _length an int or a list of lengths, computed together by getrsi
         '''
         try:
-            self.df[(_group,f'{_name}-rsi')] = ta.rsi(_feature, length=_length)
+            lengths = [_length] if np.ndim(_length) == 0 else list(_length)
+            rsi = getrsi(_feature.to_numpy(dtype=float), lengths)
+            for i, length in enumerate(lengths):
+                name = f'{_name}-rsi' if np.ndim(_length) == 0 else f'{_name}-rsi-{length}'
+                self.setcolumn(_group, name, pd.Series(rsi[:, i], index=_feature.index))
 
-            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            self.setmultiindex()
             print(f'rtn.setrsi success with {_group}')
         except Exception as e:
             print(f'rtn.setrsi failed with {_group}')
@@ -126,16 +204,484 @@ class rtn:
         finally:
             return
 
-def getrtnqs(_df, _grouper, _period=13*5, _quantiles=np.linspace(.1, 1, 9, 0)):
+class featuregraph:
+    '''
+    desc:   declarative rtn features, each node is one rtn.set* call that names its inputs,
+            either source columns of the daily df or outputs of other nodes.
+            getrtn computes only the nodes the requested outputs need, each once, and
+            memoizes node outputs per fingerprint of the source columns they depend on
+    '''
+
+    def __init__(self, _group='rtn'):
+        self.group = _group
+        self.nodes = []
+        self.outputs = {}
+        self.memo = {}
+        return
+
+    def addnode(self, _method, _outputs, _series={}, _names={}, _params={}):
+        '''
+        desc:   _series, rtn.set* arguments that take a series, by input name
+                _names, rtn.set* arguments that take a column name of the group
+        '''
+        node = {'method': _method, 'outputs': _outputs, 'series': _series, 'names': _names, 'params': _params
+            , 'inputs': list(dict.fromkeys(list(_series.values()) + list(_names.values())))}
+        self.nodes.append(node)
+        for output in _outputs:
+            self.outputs[output] = node
+        return self
+
+    def addrtn(self, _name, _feature1, _feature2, _prd=1):
+        return self.addnode('setrtn', [f'{_name}ln', f'{_name}ln^2', f'{_name}dir']
+            , _series={'_feature1': _feature1, '_feature2': _feature2}, _params={'_name': _name, '_prd': _prd})
+
+    def addstats(self, _feature, _prd):
+        prds = (_prd,) if np.ndim(_prd) == 0 else tuple(_prd)
+        return self.addnode('setstats', [output for prd in prds for output in (f'{_feature}-mu-{prd}', f'{_feature}-rank-{prd}')]
+            , _names={'_feature': _feature}, _params={'_prd': prds})
+
+    def addmax(self, _name, _feature1, _feature2):
+        return self.addnode('setmax', [_name, f'{_name}ln']
+            , _names={'_feature1': _feature1, '_feature2': _feature2}, _params={'_name': _name})
+
+    def addrsi(self, _name, _feature, _length=14):
+        lengths = _length if np.ndim(_length) == 0 else tuple(_length)
+        return self.addnode('setrsi', [f'{_name}-rsi'] if np.ndim(_length) == 0 else [f'{_name}-rsi-{length}' for length in lengths]
+            , _series={'_feature': _feature}, _params={'_name': _name, '_length': lengths})
+
+    def addhurst(self, _name, _feature, _prd, _kind='price', _simplified=False, _minwindow=3, _maxwindow=5*13):
+        return self.addnode('sethurst', [f'{_name}-hurst-{_prd}']
+            , _series={'_feature': _feature}, _params={'_name': _name, '_prd': _prd, '_kind': _kind
+            , '_simplified': _simplified, '_minwindow': _minwindow, '_maxwindow': _maxwindow})
+
+    def getfingerprint(self, _series):
+        '''
+        desc:   fingerprint of a source column and its dates
+        '''
+        digest = hashlib.sha1(np.ascontiguousarray(_series.to_numpy(dtype=float)).tobytes())
+        digest.update(np.ascontiguousarray(_series.index.values).tobytes())
+        return digest.hexdigest()
+
+    def getrequired(self, _outputs):
+        '''
+        desc:   nodes the outputs depend on, in dependency order
+        '''
+        required = []
+        def visit(_name):
+            node = self.outputs.get(_name)
+            if node is None or any(node is other for other in required):
+                return
+            for input in node['inputs']:
+                visit(input)
+            required.append(node)
+        for output in _outputs:
+            if output not in self.outputs:
+                raise KeyError(f'featuregraph has no node for {output}')
+            visit(output)
+        return required
+
+    def getrtn(self, _df, _outputs=None):
+        '''
+        desc:   rtn holding _outputs (all nodes when None) computed from the daily _df
+        '''
+        outputs = [output for node in self.nodes for output in node['outputs']] if _outputs is None else list(_outputs)
+        features = rtn(_group=self.group, _columnar=True, _capacity=max(len(outputs), 1))
+
+        fingerprints = {}
+        values = {}
+        for node in self.getrequired(outputs):
+            # a node's key is its call and the fingerprints of its inputs, resolved recursively
+            for input in node['inputs']:
+                if input not in fingerprints:
+                    fingerprints[input] = self.getfingerprint(_df[input])
+                    values[input] = _df[input]
+            key = (node['method'], tuple(node['outputs']), tuple(sorted(node['params'].items()))
+                , tuple(fingerprints[input] for input in node['inputs']))
+            if key not in self.memo:
+                work = rtn(_group=self.group, _columnar=True, _capacity=len(node['inputs']) + len(node['outputs']))
+                for name in node['names'].values():
+                    work.setcolumn(self.group, name, values[name])
+                arguments = {argument: values[name] for argument, name in node['series'].items()}
+                arguments.update(node['names'])
+                getattr(work, node['method'])(_group=self.group, **arguments, **node['params'])
+                self.memo[key] = {output: work.getcolumn(self.group, output).to_numpy(copy=True) for output in node['outputs']}
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()
+            for output in node['outputs']:
+                fingerprints[output] = digest
+                values[output] = pd.Series(self.memo[key][output], index=_df.index, name=output)
+
+        for output in outputs:
+            features.setcolumn(self.group, output, values[output])
+        return features
+
+
+class featurestream(object):
+    '''
+    desc:   bar by bar update of a featuregraph. the graph is run once over the history,
+            then every node keeps the state it needs to add one row per bar:
+                setrtn, the last _prd prices of _feature2
+                setstats, a window per period with its sum and monotonic min, max deques
+                setmax, the last max
+                setrsi, the wilder (ewm) sums of gains and losses per length
+                sethurst, an opthurst.hurstonline
+    '''
+
+    def __init__(self, _graph, _df, _outputs=None):
+        self.graph = _graph
+        self.group = _graph.group
+        self.df = _graph.getrtn(_df, _outputs).getdf()
+        self.outputs = list(self.df[self.group].columns)
+        self.nodes = _graph.getrequired(self.outputs)
+        self.pending = []
+        self.dates = []
+        values = {column: _df[column].to_numpy(dtype=float) for column in _df.columns}
+        values.update({var: self.df[(self.group,var)].to_numpy(dtype=float) for var in self.outputs})
+        self.states = [self.getstate(node, values) for node in self.nodes]
+        return
+
+    def getdf(self):
+        '''
+        desc:   bars added by update are appended to self.df in one go
+        '''
+        if self.pending:
+            df = pd.DataFrame(self.pending, index=pd.DatetimeIndex(self.dates))
+            df.columns = pd.MultiIndex.from_tuples(df.columns, names=["group", "var"])
+            self.df = pd.concat([self.df, df])
+            self.pending = []
+            self.dates = []
+        return self.df
+
+    def getstate(self, _node, _values):
+        '''
+        desc:   state of a node from the history of its inputs and outputs
+        '''
+        params = _node['params']
+        if _node['method'] == 'setrtn':
+            prd = params.get('_prd', 1)
+            return {'prices': deque(_values[_node['series']['_feature2']][-prd:], maxlen=prd)}
+        if _node['method'] == 'setstats':
+            prds = params['_prd'] if np.ndim(params['_prd']) else [params['_prd']]
+            states = []
+            for prd in prds:
+                state = {'prd': prd, 't': 0, 'window': deque(), 'sum': 0., 'nans': 0, 'min': deque(), 'max': deque()}
+                for value in _values[_node['names']['_feature']][-prd:]:
+                    self.setwindow(state, value)
+                states.append(state)
+            return {'stats': states}
+        if _node['method'] == 'setmax':
+            return {'last': _values[params['_name']][-1]}
+        if _node['method'] == 'setrsi':
+            feature = _values[_node['series']['_feature']]
+            lengths = np.atleast_1d(np.asarray(params.get('_length', 14), dtype=float))
+            change = np.diff(feature, prepend=np.nan)
+            observed = ~np.isnan(change)
+            decays = 1 - 1/lengths
+            gains = getdecayedsums(np.where(observed, np.maximum(change, 0.), 0.)[:, None], decays)[-1, :, 0]
+            losses = getdecayedsums(np.where(observed, np.maximum(-change, 0.), 0.)[:, None], decays)[-1, :, 0]
+            return {'lengths': lengths, 'decays': decays, 'gains': gains, 'losses': losses, 'count': observed.sum(), 'last': feature[-1]}
+        if _node['method'] == 'sethurst':
+            import opteq.hurst as opthurst
+            online = opthurst.hurstonline(params['_prd'], params.get('_kind', 'price'), params.get('_simplified', False)
+                , params.get('_minwindow', 3), params.get('_maxwindow', 5*13))
+            online.extend(_values[_node['series']['_feature']][-2*params['_prd']:])
+            return {'online': online}
+        raise ValueError(f'featurestream has no update for {_node["method"]}')
+
+    def setwindow(self, _state, _value):
+        '''
+        desc:   push a value into a rolling window, dropping the value that leaves it
+        '''
+        t = _state['t']
+        _state['window'].append(_value)
+        if not np.isfinite(_value):
+            _state['nans'] += 1
+        else:
+            _state['sum'] += _value
+            while _state['min'] and _state['min'][-1][1] >= _value:
+                _state['min'].pop()
+            while _state['max'] and _state['max'][-1][1] <= _value:
+                _state['max'].pop()
+            _state['min'].append((t, _value))
+            _state['max'].append((t, _value))
+        if len(_state['window']) > _state['prd']:
+            value = _state['window'].popleft()
+            if not np.isfinite(value):
+                _state['nans'] -= 1
+            else:
+                _state['sum'] -= value
+        for extrema in [_state['min'], _state['max']]:
+            while extrema and extrema[0][0] <= t - _state['prd']:
+                extrema.popleft()
+        _state['t'] = t + 1
+        return
+
+    def getnode(self, _node, _state, _values):
+        '''
+        desc:   outputs of a node for the new bar
+        '''
+        params = _node['params']
+        name = params.get('_name')
+        if _node['method'] == 'setrtn':
+            prices = _state['prices']
+            lnr = np.log(_values[_node['series']['_feature1']]) - np.log(prices[0]) if len(prices) == prices.maxlen else np.nan
+            prices.append(_values[_node['series']['_feature2']])
+            return {f'{name}ln': lnr, f'{name}ln^2': lnr**2, f'{name}dir': lnr/abs(lnr) if lnr != 0 else np.nan}
+        if _node['method'] == 'setstats':
+            feature = _node['names']['_feature']
+            value = _values[feature]
+            outputs = {}
+            for state in _state['stats']:
+                self.setwindow(state, value)
+                full = len(state['window']) == state['prd'] and state['nans'] == 0
+                low = state['min'][0][1] if full else np.nan
+                high = state['max'][0][1] if full else np.nan
+                outputs[f'{feature}-mu-{state["prd"]}'] = state['sum']/state['prd'] if full else np.nan
+                outputs[f'{feature}-rank-{state["prd"]}'] = (value - low)/(high - low) if full and high != low else np.nan
+            return outputs
+        if _node['method'] == 'setmax':
+            value = np.maximum(_values[_node['names']['_feature1']], _values[_node['names']['_feature2']])
+            outputs = {name: value, f'{name}ln': np.log(value) - np.log(_state['last'])}
+            _state['last'] = value
+            return outputs
+        if _node['method'] == 'setrsi':
+            value = _values[_node['series']['_feature']]
+            change = value - _state['last']
+            _state['last'] = value
+            _state['gains'] *= _state['decays']
+            _state['losses'] *= _state['decays']
+            if not np.isnan(change):
+                _state['gains'] += max(change, 0.)
+                _state['losses'] += max(-change, 0.)
+                _state['count'] += 1
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rsi = np.where(_state['count'] >= _state['lengths'], 100*_state['gains']/(_state['gains'] + _state['losses']), np.nan)
+            if np.ndim(params.get('_length', 14)) == 0:
+                return {f'{name}-rsi': rsi[0]}
+            return {f'{name}-rsi-{int(length)}': value for length, value in zip(_state['lengths'], rsi)}
+        if _node['method'] == 'sethurst':
+            return {f'{name}-hurst-{params["_prd"]}': _state['online'].update(_values[_node['series']['_feature']])}
+
+    def update(self, _bar):
+        '''
+        desc:   add one bar, a row of the daily df named by its date, and return its features
+        '''
+        values = {column: float(value) for column, value in _bar.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for node, state in zip(self.nodes, self.states):
+                values.update(self.getnode(node, state, values))
+        row = {(self.group,var): values[var] for var in self.outputs}
+        self.pending.append(row)
+        self.dates.append(_bar.name)
+        return row
+
+
+def getfeaturegraph(_group='rtn', _prds=[2, 3, 252], _length=14):
+    '''
+    desc:   the rtn features of main as a featuregraph
+    '''
+    prd2, prd3, prd252 = _prds
+    graph = featuregraph(_group=_group)
+    graph.addrtn('o', 'open', 'adjclose').addstats('oln^2', prd3)
+    graph.addrtn('c', 'adjclose', 'adjclose').addstats('cln^2', prd3)
+    graph.addrsi('c', 'adjclose', _length).addstats('c-rsi', prd3)
+    graph.addrtn('l', 'low', 'adjclose').addstats('lln^2', prd3)
+    graph.addrtn('h', 'high', 'adjclose').addstats('hln^2', prd3)
+    graph.addmax('lhln^2', 'lln^2', 'hln^2')
+    graph.addstats('lhln^2', [prd2, prd3, prd252])
+    graph.addrsi('lhln^2', 'lhln^2', _length)
+    return graph
+
+def getrollingextrema(_values, _prd, _ufunc, _fill):
+    '''
+    desc:   extrema of every full window of _prd. short windows reduce the shifted values,
+            longer ones use van herk gil werman: prefix and suffix accumulations within
+            blocks of _prd, one pair per window
+    '''
+    n = _values.shape[0]
+    if _prd <= 32:
+        extrema = _values[:n-_prd+1].copy()
+        for shift in range(1, _prd):
+            _ufunc(extrema, _values[shift:n-_prd+1+shift], out=extrema)
+        return extrema
+    padded = np.full(-(-n//_prd)*_prd, _fill)
+    padded[:n] = _values
+    blocks = padded.reshape(-1, _prd)
+    prefix = _ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = _ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return _ufunc(suffix[:n-_prd+1], prefix[_prd-1:n])
+
+def getrollingstats(_values, _prds):
+    '''
+    desc:   rolling mean, min, max of _values for each period of _prds, {prd: (mean, min, max)}
+            one set of prefix sums serves every period. windows with a nan or inf are nan,
+            as pandas rolling of the values with inf as nan
+    '''
+    values = np.asarray(_values, dtype=float)
+    n = values.shape[0]
+    invalid = ~np.isfinite(values)
+    nans = np.concatenate([[0], np.cumsum(invalid)])
+    sums = np.concatenate([[0.], np.cumsum(np.where(invalid, 0., values))])
+    lows = np.where(invalid, np.inf, values)
+    highs = np.where(invalid, -np.inf, values)
+
+    stats = {}
+    for prd in _prds:
+        mean = np.full(n, np.nan)
+        min = np.full(n, np.nan)
+        max = np.full(n, np.nan)
+        if prd <= n:
+            valid = (nans[prd:] - nans[:-prd]) == 0
+            mean[prd-1:] = np.where(valid, (sums[prd:] - sums[:-prd])/prd, np.nan)
+            min[prd-1:] = np.where(valid, getrollingextrema(lows, prd, np.minimum, np.inf), np.nan)
+            max[prd-1:] = np.where(valid, getrollingextrema(highs, prd, np.maximum, -np.inf), np.nan)
+        stats[prd] = (mean, min, max)
+    return stats
+
+def getdecayedsums(_x, _decays):
+    '''
+    desc:   s(t) = x(t) + decay*s(t-1) down the rows of _x (rows, columns) for every decay,
+            shaped (rows, decays, columns). closed form d^t*cumsum(x(t)*d^-t) within blocks
+            short enough for d^-t to stay finite, s carried from block to block.
+            _x >= 0, so the cumsum keeps its relative precision
+    '''
+    n, k = _x.shape
+    decays = np.asarray(_decays, dtype=float)
+    with np.errstate(divide='ignore'):
+        block = max(1, int(100*np.log(10)/-np.log(decays.min())))
+    sums = np.empty((n, decays.shape[0], k))
+    carry = np.zeros((decays.shape[0], k))
+    for start in range(0, n, block):
+        x = _x[start:start+block]
+        powers = decays[None, :]**np.arange(x.shape[0])[:, None]
+        cumsum = np.cumsum(x[:, None, :]/powers[:, :, None], axis=0)
+        sums[start:start+x.shape[0]] = powers[:, :, None]*(cumsum + decays[None, :, None]*carry[None])
+        carry = sums[start+x.shape[0]-1]
+    return sums
+
+def getrsi(_values, _lengths=[14], _drift=1):
+    '''
+    desc:   wilder rsi of _values (rows) or (rows, columns) for every length, shaped
+            (rows, lengths) or (rows, lengths, columns). as pandas_ta.rsi, gains and losses
+            are smoothed by ewm(alpha=1/length, adjust=True, min_periods=length); the ewm
+            weights are shared, so rsi = 100*gains/(gains + losses) of the decayed sums
+    '''
+    values = np.asarray(_values, dtype=float)
+    columns = values.reshape(values.shape[0], -1)
+    lengths = np.asarray(_lengths, dtype=float)
+
+    change = np.full(columns.shape, np.nan)
+    change[_drift:] = columns[_drift:] - columns[:-_drift]
+    observed = ~np.isnan(change)
+    gains = getdecayedsums(np.where(observed, np.maximum(change, 0.), 0.), 1 - 1/lengths)
+    losses = getdecayedsums(np.where(observed, np.maximum(-change, 0.), 0.), 1 - 1/lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100*gains/(gains + losses)
+    rsi[np.cumsum(observed, axis=0)[:, None, :] < lengths[None, :, None]] = np.nan
+    return rsi[:, :, 0] if values.ndim == 1 else rsi
+
+def checkrsi(_feature, _length=14):
+    '''
+    desc:   largest absolute difference between getrsi and pandas_ta.rsi, None without pandas_ta
+    '''
+    try:
+        import pandas_ta as ta
+    except ImportError:
+        return None
+    return np.nanmax(np.abs(getrsi(_feature.to_numpy(dtype=float), [_length])[:, 0] - ta.rsi(_feature, length=_length).to_numpy()))
+
+def getruns(_lnr, _dir):
+    '''
+    desc:   runs of equal _dir down the rows of (rows) or (rows, columns) arrays, a nan dir
+            is a run of its own. for each bar
+                runid, runobs (bar of the run), runlen (bars of the whole run)
+                runrtn, cumulative lnr of the run to the bar
+                rundd, max drawdown of the run to the bar. a run has one sign,
+                    so it is 0 for up runs and -runrtn for down runs
+                start, end, first and last bar of a run
+    '''
+    lnr = np.asarray(_lnr, dtype=float)
+    dir = np.asarray(_dir, dtype=float)
+    n = dir.shape[0]
+    rows = np.arange(n).reshape((n,) + (1,)*(dir.ndim - 1))
+
+    same = dir[1:] == dir[:-1]
+    start = np.concatenate([np.ones((1,) + dir.shape[1:], dtype=bool), ~same])
+    end = np.concatenate([~same, np.ones((1,) + dir.shape[1:], dtype=bool)])
+    first = np.maximum.accumulate(np.where(start, rows, 0), axis=0)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(end, rows, n), axis=0), axis=0), axis=0)
+
+    cumsum = np.cumsum(np.where(np.isnan(lnr), 0., lnr), axis=0)
+    before = np.take_along_axis(cumsum - np.where(np.isnan(lnr), 0., lnr), first, axis=0)
+    runrtn = np.where(np.isnan(lnr), np.nan, cumsum - before)
+    return {'runid': np.cumsum(start, axis=0) - 1, 'runobs': rows - first + 1, 'runlen': last - first + 1
+        , 'runrtn': runrtn, 'rundd': np.maximum(-runrtn, 0.), 'start': start, 'end': end}
+
+def getgroupqs(_df, _grouper, _period, _quantiles):
+    '''
+    desc:   groupby(_grouper).tail(_period) then groupby(_grouper).describe(percentiles=_quantiles),
+            groups x (column, stat). every column is sorted once within its groups, with the
+            nans of a group last, and count, mean, std, min, quantiles, max read off together.
+            as describe, the median is always included and quantiles interpolate linearly
+    '''
+    from pandas.io.formats.format import format_percentiles
+
+    groups = _df.groupby(_grouper)
+    codes = groups.ngroup().to_numpy()
+    keep = ~np.isnan(codes) & (groups.cumcount(ascending=False).to_numpy() < _period)
+    codes = codes[keep].astype(int)
+    sizes = groups.size()
+    keys, ngroups = sizes.index, sizes.shape[0]
+    quantiles = np.unique(np.concatenate([np.asarray(_quantiles, dtype=float), [0.5]]))
+    columns = [column for column in _df.columns if column not in (_grouper if isinstance(_grouper, list) else [_grouper])]
+
+    stats = {}
+    for column in columns:
+        values = _df[column].to_numpy(dtype=float)[keep]
+        order = np.lexsort((values, codes))
+        values = values[order]
+        sorted = codes[order]
+        valid = ~np.isnan(values)
+        starts = np.searchsorted(sorted, np.arange(ngroups))
+        count = np.bincount(sorted, weights=valid, minlength=ngroups)
+        sums = np.bincount(sorted, weights=np.where(valid, values, 0.), minlength=ngroups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = sums/count
+            deviations = np.where(valid, values - mean[sorted], 0.)
+            std = np.sqrt(np.bincount(sorted, weights=deviations**2, minlength=ngroups)/(count - 1))
+        std[count < 2] = np.nan
+
+        last = np.maximum(count - 1, 0).astype(int)
+        column_stats = {'count': count, 'mean': mean, 'std': std}
+        for label, quantile in zip(['min'] + format_percentiles(quantiles) + ['max'], np.concatenate([[0.], quantiles, [1.]])):
+            # np.percentile linear interpolation
+            position = quantile*last
+            low = np.floor(position).astype(int)
+            high = np.ceil(position).astype(int)
+            a = values[np.minimum(starts + low, values.shape[0] - 1)]
+            b = values[np.minimum(starts + high, values.shape[0] - 1)]
+            t = position - low
+            with np.errstate(invalid='ignore'):
+                column_stats[label] = np.where(t >= 0.5, b - (b - a)*(1 - t), a + (b - a)*t)
+            column_stats[label][count == 0] = np.nan
+        for label, value in column_stats.items():
+            stats[(column, label)] = value
+    return pd.DataFrame(stats, index=keys)
+
+def getrtnqs(_df, _grouper, _period=13*5, _quantiles=np.linspace(.1, 1, 9, 0), _sketch=None, _until=None):
     # [0.00, 0.01, 0.02, 0.03, 0.05, 0.10, 0.15, 0.20, 0.30, 0.50, 0.70, 0.80, 0.85, 0.90, 0.95, 0.97, 0.98, 0.99, 1.00]
     # _quantiles=np.linspace(.1, 1, 9, 0)
     '''
     desc:   lnr quantiles
+            with a groupsketch, the rows of _df after its watermark and up to _until are
+            added to it and its approximate quantiles of the whole history are returned,
+            _period does not apply
     '''
     try:
         df = pd.DataFrame()
-        df = _df.groupby(_grouper).tail(_period)
-        df = df.groupby(_grouper).describe(percentiles=_quantiles)
+        if _sketch is None:
+            df = getgroupqs(_df, _grouper, _period, _quantiles)
+        else:
+            df = _sketch.update(_df, _until).getdescribe(_quantiles)
         print(f'getrtnqs success, {_period} periods')
     except Exception as e:
         print(f'getrtnqs failed, {_period} periods')
@@ -144,6 +690,191 @@ def getrtnqs(_df, _grouper, _period=13*5, _quantiles=np.linspace(.1, 1, 9, 0)):
         return df.T
 
 
+class quantilesketch(object):
+    '''
+    desc:   mergeable quantile sketch of a stream of values, ddsketch: counts of values in
+            log buckets (gamma^(k-1), gamma^k], gamma = (1+alpha)/(1-alpha), negatives mirrored
+            and |x| < minvalue counted as 0. count, mean, std, min, max are exact.
+            error bound, against describe: a quantile interpolates between the order
+            statistics x(lo), x(hi) at rank q*(n-1) and is within
+                alpha*max(|x(lo)|, |x(hi)|) + minvalue
+            of the exact value, for any number of updates and merges
+    '''
+
+    def __init__(self, _alpha=0.005, _minvalue=1e-12):
+        self.alpha = _alpha
+        self.minvalue = _minvalue
+        self.gamma = (1 + _alpha)/(1 - _alpha)
+        self.lngamma = np.log(self.gamma)
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        self.zero = 0
+        self.stores = {'positive': [0, np.zeros(0, dtype=np.int64)], 'negative': [0, np.zeros(0, dtype=np.int64)]}
+        return
+
+    def setstore(self, _store, _keys, _counts):
+        '''
+        desc:   add counts at bucket keys to a store, [offset, counts], grown to cover them
+        '''
+        if _keys.shape[0] == 0:
+            return
+        offset, counts = self.stores[_store]
+        low = min(_keys.min(), offset) if counts.shape[0] else _keys.min()
+        high = max(_keys.max() + 1, offset + counts.shape[0]) if counts.shape[0] else _keys.max() + 1
+        grown = np.zeros(high - low, dtype=np.int64)
+        grown[offset - low:offset - low + counts.shape[0]] = counts
+        grown += np.bincount(_keys - low, weights=_counts, minlength=high - low).astype(np.int64)
+        self.stores[_store] = [low, grown]
+        return
+
+    def setmoments(self, _count, _mean, _m2, _min, _max):
+        '''
+        desc:   combine count, mean and sum of squared deviations, chan et al.
+        '''
+        count = self.count + _count
+        delta = _mean - self.mean
+        self.mean += delta*_count/count
+        self.m2 += _m2 + delta**2*self.count*_count/count
+        self.count = count
+        self.min = min(self.min, _min)
+        self.max = max(self.max, _max)
+        return
+
+    def update(self, _values):
+        '''
+        desc:   add values, nans are skipped
+        '''
+        values = np.asarray(_values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.shape[0] == 0:
+            return self
+        mean = values.mean()
+        self.setmoments(values.shape[0], mean, ((values - mean)**2).sum(), values.min(), values.max())
+
+        # values below minvalue, zero included, are counted apart and never reach the log
+        self.zero += int((np.abs(values) < self.minvalue).sum())
+        for store, magnitude in [('positive', values[values >= self.minvalue]), ('negative', -values[values <= -self.minvalue])]:
+            self.setstore(store, np.ceil(np.log(magnitude)/self.lngamma).astype(np.int64), np.ones(magnitude.shape[0]))
+        return self
+
+    def merge(self, _other):
+        '''
+        desc:   add the values of another sketch of the same alpha and minvalue
+        '''
+        if _other.count == 0:
+            return self
+        self.setmoments(_other.count, _other.mean, _other.m2, _other.min, _other.max)
+        self.zero += _other.zero
+        for store in ['positive', 'negative']:
+            offset, counts = _other.stores[store]
+            self.setstore(store, np.arange(offset, offset + counts.shape[0]), counts)
+        return self
+
+    def getquantiles(self, _quantiles):
+        '''
+        desc:   approximate quantiles, linear between the ranks around q*(n-1) as describe
+        '''
+        quantiles = np.asarray(_quantiles, dtype=float)
+        if self.count == 0:
+            return np.full(quantiles.shape, np.nan)
+        negoffset, negcounts = self.stores['negative']
+        posoffset, poscounts = self.stores['positive']
+        # bucket values in ascending order: negatives from the largest magnitude, zero, positives
+        represent = lambda _keys: 2*self.gamma**_keys/(self.gamma + 1)
+        values = np.concatenate([-represent(np.arange(negoffset, negoffset + negcounts.shape[0]))[::-1], [0.]
+            , represent(np.arange(posoffset, posoffset + poscounts.shape[0]))])
+        cumulative = np.cumsum(np.concatenate([negcounts[::-1], [self.zero], poscounts]))
+
+        position = quantiles*(self.count - 1)
+        low = np.floor(position)
+        high = np.ceil(position)
+        a = np.clip(values[np.searchsorted(cumulative, low, side='right')], self.min, self.max)
+        b = np.clip(values[np.searchsorted(cumulative, high, side='right')], self.min, self.max)
+        t = position - low
+        return np.where(t >= 0.5, b - (b - a)*(1 - t), a + (b - a)*t)
+
+    def getdescribe(self, _quantiles):
+        '''
+        desc:   count, mean, std, min, quantiles, max as describe, the median included
+        '''
+        from pandas.io.formats.format import format_percentiles
+
+        quantiles = np.unique(np.concatenate([np.asarray(_quantiles, dtype=float), [0.5]]))
+        stats = {'count': float(self.count), 'mean': self.mean if self.count else np.nan
+            , 'std': np.sqrt(self.m2/(self.count - 1)) if self.count > 1 else np.nan
+            , 'min': self.min if self.count else np.nan}
+        stats.update(zip(format_percentiles(quantiles), self.getquantiles(quantiles)))
+        stats['max'] = self.max if self.count else np.nan
+        return stats
+
+
+class groupsketch(object):
+    '''
+    desc:   a quantilesketch per group and column, updated as bars arrive and merged
+            across symbols or worker processes. getdescribe has the layout of getgroupqs.
+            watermark, the date of the last row added, a frame given again only adds the
+            rows after it
+    '''
+
+    def __init__(self, _grouper, _alpha=0.005, _minvalue=1e-12):
+        self.grouper = _grouper
+        self.alpha = _alpha
+        self.minvalue = _minvalue
+        self.sketches = {}
+        self.watermark = None
+        return
+
+    def getsketch(self, _key, _column):
+        if (_key, _column) not in self.sketches:
+            self.sketches[(_key, _column)] = quantilesketch(self.alpha, self.minvalue)
+        return self.sketches[(_key, _column)]
+
+    def update(self, _df, _until=None):
+        '''
+        desc:   add the rows of _df after the watermark and up to _until, the last final row
+                (nat for none), grouped by self.grouper
+        '''
+        rows = np.ones(_df.shape[0], dtype=bool)
+        if self.watermark is not None:
+            rows &= _df.index > self.watermark
+        if _until is not None:
+            rows &= _df.index <= _until
+        df = _df.loc[rows]
+        if df.empty:
+            return self
+        self.watermark = df.index.max()
+        columns = [column for column in df.columns if column not in (self.grouper if isinstance(self.grouper, list) else [self.grouper])]
+        for key, df in df.groupby(self.grouper):
+            for column in columns:
+                self.getsketch(key, column).update(df[column].to_numpy(dtype=float))
+        return self
+
+    def merge(self, _other):
+        '''
+        desc:   add the sketches of another groupsketch, the watermark stays that of self
+        '''
+        for (key, column), sketch in _other.sketches.items():
+            self.getsketch(key, column).merge(sketch)
+        return self
+
+    def getdescribe(self, _quantiles):
+        '''
+        desc:   groups x (column, stat), as getgroupqs
+        '''
+        keys = sorted(set(key for key, column in self.sketches))
+        columns = list(dict.fromkeys(column for key, column in self.sketches))
+        stats = {}
+        for column in columns:
+            describe = [self.getsketch(key, column).getdescribe(_quantiles) for key in keys]
+            for label in describe[0]:
+                stats[(column, label)] = [stat[label] for stat in describe]
+        index = pd.MultiIndex.from_tuples(keys, names=self.grouper) if isinstance(self.grouper, list) else pd.Index(keys, name=self.grouper)
+        return pd.DataFrame(stats, index=index)
+
+
 '''
 # ##### run measures
 '''
@@ -157,9 +888,22 @@ class runner:
         self.rtn = _rtn
         self.group = _group
         self.df = pd.DataFrame()
+        # update mode, bars not yet in self.df and the state of the current run
+        self.pending = []
+        self.dates = []
+        self.state = None
         return
 
     def getdf(self):
+        '''
+        desc:   bars added by update are appended to self.df in one go
+        '''
+        if self.pending:
+            df = pd.DataFrame(self.pending, index=pd.DatetimeIndex(self.dates))
+            df.columns = pd.MultiIndex.from_tuples(df.columns, names=["group", "var"])
+            self.df = pd.concat([self.df, df]) if not self.df.empty else df
+            self.pending = []
+            self.dates = []
         return self.df
 
     def getdfgrp(self, _grp):
@@ -171,19 +915,29 @@ class runner:
     def setrun(self):
         '''
         desc:   runner stats
+                runs of one dir from getruns. as before dirchg marks the last bar of a run,
+                len the obs since the previous run ended, lengrp len over the run
         '''
         try:
             self.df[(self.group,'lnr')] = self.rtn['cln']
             self.df[(self.group,'lnr^2')] = self.rtn['cln^2']
 
             self.df[(self.group,'dir')] = self.rtn['cdir']
-            self.df[(self.group,'dirchg')] = self.df[(self.group,'dir')] != self.df[(self.group,'dir')].shift(-1)
+            runs = getruns(self.rtn['cln'].to_numpy(dtype=float), self.rtn['cdir'].to_numpy(dtype=float))
+            self.df[(self.group,'dirchg')] = runs['end']
 
-            self.df[(self.group, 'len')] = self.idx['obs'].loc[self.df[(self.group,'dirchg')]==True] \
-                - self.idx['obs'].loc[self.df[(self.group,'dirchg')]==True].shift()
+            obs = self.idx['obs'].reindex(self.rtn.index).to_numpy(dtype=float)
+            ends = np.flatnonzero(runs['end'])
+            length = np.full(obs.shape[0], np.nan)
+            length[ends[1:]] = obs[ends[1:]] - obs[ends[:-1]]
+            self.df[(self.group, 'len')] = length
             self.df[(self.group, 'lengrp')] = self.df[(self.group, 'len')].bfill()
 
+            for var in ['runid', 'runobs', 'runrtn', 'rundd']:
+                self.df[(self.group, var)] = runs[var]
+
             self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            self.setstate()
             print(f'runner.setrun success with {self.group}')
         except Exception as e:
             print(f'runner.setrun failed with {self.group}')
@@ -191,11 +945,99 @@ class runner:
         finally:
             return
 
-    def setdescribe(self, _grouper=['dir','lengrp'], _keep=['dir','lengrp','lnr','lnr^2'], _period=26*5, _quantiles=np.linspace(.1, 1, 9, 0)):
+    def setstate(self):
+        '''
+        desc:   state of the current run from the last bars of self.df, for update
+        '''
+        if self.getdf().empty:
+            self.state = {'bars': 0, 'dir': np.nan, 'runid': -1, 'start': 0, 'fill': 0, 'runobs': 0, 'runrtn': np.nan, 'rundd': np.nan
+                , 'peak': np.nan, 'obs': 0., 'endobs': np.nan}
+            return
+        df = self.df[self.group]
+        last = df.iloc[-1]
+        start = df.shape[0] - int(last['runobs'])
+        ends = np.flatnonzero(df['dirchg'].to_numpy()[:start])
+        lengths = np.flatnonzero(df['len'].notna().to_numpy()[:start])
+        obs = self.idx['obs'].reindex(df.index).to_numpy(dtype=float)
+        self.state = {'bars': df.shape[0], 'dir': last['dir'], 'runid': int(last['runid']), 'start': start
+            , 'fill': lengths[-1] + 1 if lengths.shape[0] else 0
+            , 'runobs': int(last['runobs']), 'runrtn': last['runrtn'], 'rundd': last['rundd']
+            , 'peak': max(0., last['runrtn']) if np.isfinite(last['runrtn']) else np.nan
+            , 'obs': obs[-1], 'endobs': obs[ends[-1]] if ends.shape[0] else np.nan}
+        return
+
+    def setvalue(self, _position, _var, _value):
+        '''
+        desc:   set a bar of self.df or of the pending bars by its position
+        '''
+        if _position < self.df.shape[0]:
+            self.df.iloc[_position, self.df.columns.get_loc((self.group,_var))] = _value
+        else:
+            self.pending[_position - self.df.shape[0]][(self.group,_var)] = _value
+        return
+
+    def update(self, _bar):
+        '''
+        desc:   extend the runs by one bar, a row of rtn named by its date. the current run
+                continues from the kept state, only its own bars (and those before it with
+                no len yet) are touched to keep dirchg, len and lengrp as setrun sets them
+        '''
+        if self.state is None:
+            self.setstate()
+        state = self.state
+        lnr = float(_bar['cln'])
+        dir = float(_bar['cdir'])
+        obs = state['obs'] + 1
+        position = state['bars']
+
+        if dir == state['dir']:
+            # the previous bar no longer ends the run
+            self.setvalue(position - 1, 'dirchg', False)
+            self.setvalue(position - 1, 'len', np.nan)
+            state['runobs'] += 1
+            state['runrtn'] += lnr
+        else:
+            if position > 0:
+                if not np.isnan(state['obs'] - state['endobs']):
+                    state['fill'] = position
+                state['endobs'] = state['obs']
+            state['dir'] = dir
+            state['runid'] += 1
+            state['start'] = position
+            state['runobs'] = 1
+            state['runrtn'] = lnr
+            state['peak'] = 0.
+            state['rundd'] = 0.
+        state['peak'] = max(state['peak'], state['runrtn'])
+        state['rundd'] = max(state['rundd'], state['peak'] - state['runrtn'])
+        length = obs - state['endobs']
+
+        self.pending.append({(self.group,'lnr'): lnr, (self.group,'lnr^2'): float(_bar['cln^2']), (self.group,'dir'): dir
+            , (self.group,'dirchg'): True, (self.group,'len'): length, (self.group,'lengrp'): length
+            , (self.group,'runid'): state['runid'], (self.group,'runobs'): state['runobs']
+            , (self.group,'runrtn'): state['runrtn'], (self.group,'rundd'): state['rundd'] if np.isfinite(lnr) else np.nan})
+        self.dates.append(_bar.name)
+        if not np.isnan(length):
+            for run in range(state['fill'], position):
+                self.setvalue(run, 'lengrp', length)
+        state['bars'] = position + 1
+        state['obs'] = obs
+        return self.pending[-1]
+
+    def setdescribe(self, _grouper=['dir','lengrp'], _keep=['dir','lengrp','lnr','lnr^2'], _period=26*5, _quantiles=np.linspace(.1, 1, 9, 0), _sketch=None):
+        '''
+        desc:   quantiles by dir and lengrp. a sketch takes the bars of ended runs only,
+                lengrp of the current run changes as it extends
+        '''
         try:
+            until = None
+            if _sketch is not None:
+                runid = self.getdf()[(self.group,'runid')]
+                ended = runid.index[runid.to_numpy() < runid.iloc[-1]]
+                until = ended[-1] if ended.shape[0] else pd.NaT
             df = self.df[self.group][_keep]
             df = df.dropna()
-            self.dfdesc = optmeas.getrtnqs(_df=df, _grouper=_grouper, _period=_period, _quantiles=_quantiles)
+            self.dfdesc = getrtnqs(_df=df, _grouper=_grouper, _period=_period, _quantiles=_quantiles, _sketch=_sketch, _until=until)
             print(f'runner.setdescribe success with {self.group}')
         except Exception as e:
             print(f'runner.setdescribe failed with {self.group}')
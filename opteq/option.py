@@ -9,12 +9,94 @@ import pandas as pd
 import numpy as np
 
 from datetime import datetime
-import pandas_market_calendars as mcal
 import calendar
+import os
+from collections import deque
 
 import opteq.time as opttime
 import opteq.measures as optmeas
 
+# exchange holidays and business day calendars, shared by every schedule of the process
+# holidays persist in PATHCACHE, stamped with the pandas_market_calendars version
+PATHCACHE = os.path.join(os.path.expanduser('~'), '.cache', 'opteq')
+HOLIDAYS = {}
+BUSDAYCALENDARS = {}
+
+def getcalendarversion():
+    '''
+    desc:   version stamp of the holiday cache, read once
+    '''
+    if 'version' not in HOLIDAYS:
+        from importlib import metadata
+        try:
+            HOLIDAYS['version'] = metadata.version('pandas_market_calendars')
+        except metadata.PackageNotFoundError:
+            HOLIDAYS['version'] = 'unknown'
+    return HOLIDAYS['version']
+
+def getexchholidays(_exch, _path=None):
+    '''
+    desc:   all holidays of an exchange as datetime64[D], from memory, else from the
+            disk cache when its version stamp matches, else from pandas_market_calendars
+    '''
+    if _exch in HOLIDAYS:
+        return HOLIDAYS[_exch]
+    path = PATHCACHE if _path is None else _path
+    version = getcalendarversion()
+    file = os.path.join(path, f'holidays-{_exch}.npz')
+    try:
+        with np.load(file) as cached:
+            if str(cached['version']) == version:
+                HOLIDAYS[_exch] = cached['holidays']
+                return HOLIDAYS[_exch]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    import pandas_market_calendars as mcal
+    holidays = np.array(mcal.get_calendar(_exch).holidays().holidays, dtype='datetime64[D]')
+    HOLIDAYS[_exch] = holidays
+    try:
+        os.makedirs(path, exist_ok=True)
+        np.savez(file, holidays=holidays, version=np.array(version))
+    except OSError as e:
+        print(f'option.getexchholidays failed to cache {_exch}')
+        print(e)
+    return holidays
+
+def getbusdaycalendar(_exch, _dtestart, _dteend, _path=None):
+    '''
+    desc:   np.busdaycalendar of the exchange holidays in the years of _dtestart to _dteend
+    '''
+    start = np.datetime64(f'{pd.Timestamp(_dtestart).year - 1}-01-01', 'D')
+    end = np.datetime64(f'{pd.Timestamp(_dteend).year + 2}-01-01', 'D')
+    key = (_exch, start, end)
+    if key not in BUSDAYCALENDARS:
+        holidays = getexchholidays(_exch, _path)
+        BUSDAYCALENDARS[key] = np.busdaycalendar(holidays=holidays[(holidays >= start) & (holidays < end)])
+    return BUSDAYCALENDARS[key]
+
+def getsparsetable(_values, _ufunc):
+    '''
+    desc:   sparse table of _values, row k the _ufunc of each run of 2^k values
+    '''
+    table = [_values]
+    while (1 << len(table)) <= _values.shape[0]:
+        width = 1 << (len(table) - 1)
+        table.append(_ufunc(table[-1][:-width], table[-1][width:]))
+    return table
+
+def getrangeextrema(_table, _start, _end, _ufunc):
+    '''
+    desc:   _ufunc of the values in [_start, _end] for each pair of positions, O(1) a pair
+    '''
+    level = np.floor(np.log2(_end - _start + 1)).astype(int)
+    extrema = np.empty(_start.shape[0])
+    for k in np.unique(level):
+        pick = level == k
+        extrema[pick] = _ufunc(_table[k][_start[pick]], _table[k][_end[pick] - (1 << k) + 1])
+    return extrema
+
+
 class schedule(object):
     '''
     desc:   schedule base class
@@ -27,12 +109,15 @@ class schedule(object):
                 cboe calandar = 'CFE'
     '''
 
-    def __init__(self, _dtestart=datetime(2021,1,1), _dteend=datetime(2022,1,1), _exch='CME_Equity', _freq='W-FRI', _busconv='preceding'):
+    def __init__(self, _dtestart=datetime(2021,1,1), _dteend=datetime(2022,1,1), _exch='CME_Equity', _freq='W-FRI', _busconv='preceding', _holidays=None):
         self.dtestart = _dtestart
         self.dteend = _dteend
         self.exchange = _exch
         self.freq = _freq
         self.busconv = _busconv
+        self.holidays = _holidays
+        self.busdaycalendar = None
+        self.group = None
         self.df = pd.DataFrame()
         return
 
@@ -41,15 +126,28 @@ class schedule(object):
         desc:   get exchange holidays
                 pandas_market_calendars as mcal
                     cboe calandar = 'CFE'
+                from the process and disk cache, getexchholidays, or given as _holidays
         '''
-        exch = mcal.get_calendar(self.exchange)
-        return list(exch.holidays().holidays)
+        if self.holidays is None:
+            self.holidays = list(pd.DatetimeIndex(getexchholidays(self.exchange)))
+        return self.holidays
+
+    def getbusdaycalendar(self):
+        '''
+        desc:   np.busdaycalendar of the schedule, shared by the process unless _holidays were given
+        '''
+        if self.busdaycalendar is None:
+            if self.holidays is None:
+                self.busdaycalendar = getbusdaycalendar(self.exchange, self.dtestart, self.dteend)
+            else:
+                self.busdaycalendar = np.busdaycalendar(holidays=np.array(self.holidays, dtype='datetime64[D]'))
+        return self.busdaycalendar
 
     def getbusdays(self):
         '''
         desc:   apply business day conventions
         '''
-        self.df = np.busday_offset(self.df.values.astype('datetime64[D]'), 0, roll=self.busconv, holidays=self.getholidays())
+        self.df = np.busday_offset(self.df.values.astype('datetime64[D]'), 0, roll=self.busconv, busdaycal=self.getbusdaycalendar())
         self.df = pd.to_datetime(self.df).dropna()
         self.df = pd.DataFrame(self.df, index=self.df, columns = [(self.group,'expiry')])
         return
@@ -59,14 +157,17 @@ class schedule(object):
         desc:   map date to weekday
         '''
         self.df[(self.group,'freq')] = self.freq
-        self.df[(self.group,'day')] = [f'{calendar.day_name[date.weekday()]}' for date in self.df.index]
+        self.df[(self.group,'day')] = np.array(calendar.day_name)[self.df.index.weekday]
         return
 
     def setsched(self, _group):
         '''
         desc:   given a start and end date, return a list of expiry days
+                a schedule already set for _group is kept
         '''
         try:
+            if self.group == _group and not self.df.empty:
+                return
             self.group = _group
             self.df = pd.date_range(self.dtestart-pd.Timedelta("7 days"), self.dteend+pd.Timedelta("7 days"), freq=self.freq)
             self.getbusdays()
@@ -96,6 +197,8 @@ class underlying(object):
     '''
     desc:   assess underlying inrelation to options expiries
     '''
+    # expiry dates of path kept by update to find the open of a cycle
+    OPENS = 4
 
     def __init__(self, _group, _idx, _rtn, _tdays, _scheds):
         self.group = _group
@@ -104,9 +207,24 @@ class underlying(object):
         self.tdays = _tdays
         self.scheds = _scheds
         self.df = pd.DataFrame()
+        self.dfpath = pd.DataFrame()
+        self.path = None
+        # update mode, bars not yet in self.df and the expiry pointer and path of the current cycle
+        self.pending = []
+        self.dates = []
+        self.state = None
         return
 
     def getdf(self):
+        '''
+        desc:   bars added by update are appended to self.df in one go
+        '''
+        if self.pending:
+            df = pd.DataFrame(self.pending, index=pd.DatetimeIndex(self.dates))
+            df.columns = pd.MultiIndex.from_tuples(df.columns, names=["group", "var"])
+            self.df = pd.concat([self.df, df]) if not self.df.empty else df
+            self.pending = []
+            self.dates = []
         return self.df
 
     def getdfgrp(self, _grp):
@@ -186,6 +304,134 @@ class underlying(object):
         finally:
             return
 
+    def getexpiries(self):
+        '''
+        desc:   expiries of the merged schedules in date order with their freq, day,
+                open (the previous expiry), diff and obsdiff
+        '''
+        scheds = [sched.getsched()[self.group] for sched in self.scheds]
+        expiry = np.concatenate([sched.index.values for sched in scheds]).astype('datetime64[ns]')
+        freq = np.concatenate([sched['freq'].to_numpy(dtype=object) for sched in scheds])
+        day = np.concatenate([sched['day'].to_numpy(dtype=object) for sched in scheds])
+        order = np.argsort(expiry, kind='stable')
+        expiry, freq, day = expiry[order], freq[order], day[order]
+
+        open = np.concatenate([np.array(['NaT'], dtype='datetime64[ns]'), expiry[:-1]])
+        diff = (expiry - open)/np.timedelta64(1, 'D')
+        obsdiff = np.where(np.isin(expiry, open), 0., np.nan)
+        return expiry, freq, day, open, diff, obsdiff
+
+    def setalign(self):
+        '''
+        desc:   map every trading day to the next expiry of the merged schedules, its open
+                date and the days and trading days (obs) to expiry, np.searchsorted on
+                datetime64 with one frame built at the end. as getsched, setobs, setfill:
+                    open, the previous expiry of the merged schedules
+                    diff, obsdiff only on expiry days
+                    expiries off idx or tdays are skipped, days off tdays are nan
+        '''
+        try:
+            expiry, freq, day, open, diff, obsdiff = self.getexpiries()
+
+            days = self.idx.index.values.astype('datetime64[ns]')
+            tdays = np.sort(self.tdays.getschedidx().values.astype('datetime64[ns]'))
+            kept = np.flatnonzero(np.isin(expiry, days) & np.isin(expiry, tdays))
+
+            # next kept expiry on or after each day
+            pos = np.searchsorted(expiry[kept], days, side='left')
+            valid = (pos < kept.shape[0]) & np.isin(days, tdays)
+            row = kept[np.minimum(pos, max(kept.shape[0] - 1, 0))] if kept.shape[0] else np.zeros(days.shape[0], dtype=int)
+            isexpiry = valid & (expiry[row] == days)
+
+            nat = np.array('NaT', dtype='datetime64[ns]')
+            dte = (expiry[row] - days)/np.timedelta64(1, 'D')
+            obsdte = np.searchsorted(tdays, expiry[row]) - np.searchsorted(tdays, days)
+            self.df = pd.DataFrame({(self.group,'expiry'): np.where(valid, expiry[row], nat)
+                , (self.group,'freq'): np.where(valid, freq[row], np.nan)
+                , (self.group,'day'): np.where(valid, day[row], np.nan)
+                , (self.group,'open'): np.where(valid, open[row], nat)
+                , (self.group,'diff'): np.where(isexpiry, diff[row], np.nan)
+                , (self.group,'obsdiff'): np.where(isexpiry, obsdiff[row], np.nan)
+                , (self.group,'dte'): np.where(valid, dte, np.nan)
+                , (self.group,'obsdte'): np.where(valid, obsdte, np.nan)}, index=self.idx.index)
+
+            self.df.columns = pd.MultiIndex.from_tuples(self.df.columns, names=["group", "var"])
+            print(f'underlying.setalign success {self.group}')
+        except Exception as e:
+            print(f'underlying.setalign failed {self.group}')
+            print(e)
+        finally:
+            return
+
+    def getpaths(self, _day, _expiry, _open):
+        '''
+        desc:   log returns along the close path for idx positions _day <= _expiry,
+                _open -1 where there is none
+                    rtnexpiry, day to expiry
+                    rtnopen, open to expiry
+                    maxexpiry, minexpiry, excursion from the day up to expiry
+                prefix sums of cln for the returns, sparse tables for the extrema
+        '''
+        if self.path is None:
+            cln = self.rtn['cln'].reindex(self.idx.index).to_numpy(dtype=float)
+            path = np.cumsum(np.where(np.isnan(cln), 0., cln))
+            self.path = (path, getsparsetable(path, np.maximum), getsparsetable(path, np.minimum))
+        path, highs, lows = self.path
+        return {'rtnexpiry': path[_expiry] - path[_day]
+            , 'rtnopen': np.where(_open >= 0, path[_expiry] - path[np.maximum(_open, 0)], np.nan)
+            , 'maxexpiry': getrangeextrema(highs, _day, _expiry, np.maximum) - path[_day]
+            , 'minexpiry': getrangeextrema(lows, _day, _expiry, np.minimum) - path[_day]}
+
+    def setpaths(self):
+        '''
+        desc:   path returns to expiry of every trading day, in self.df for the merged
+                schedules and in self.dfpath, one row a (day, schedule), for each schedule.
+                expiries and opens off idx have no path, as setalign
+        '''
+        try:
+            days = self.idx.index.values.astype('datetime64[ns]')
+            tdays = np.sort(self.tdays.getschedidx().values.astype('datetime64[ns]'))
+
+            # merged schedules, from setalign
+            valid = self.df[(self.group,'expiry')].notna().to_numpy()
+            day = np.flatnonzero(valid)
+            expiry = np.searchsorted(days, self.df[(self.group,'expiry')].to_numpy()[valid].astype('datetime64[ns]'))
+            open = self.df[(self.group,'open')].to_numpy()[valid].astype('datetime64[ns]')
+            openpos = np.searchsorted(days, open)
+            openpos = np.where((openpos < days.shape[0]) & (days[np.minimum(openpos, days.shape[0] - 1)] == open), openpos, -1)
+            for var, values in self.getpaths(day, expiry, openpos).items():
+                self.df[(self.group,var)] = np.nan
+                self.df.iloc[day, self.df.columns.get_loc((self.group,var))] = values
+
+            # each schedule, its own next expiry and open
+            ontdays = np.isin(days, tdays)
+            rows = {'day': [], 'expiry': [], 'open': [], 'freq': []}
+            for sched in self.scheds:
+                expiries = np.unique(sched.getschedidx().values.astype('datetime64[ns]'))
+                expiries = expiries[np.isin(expiries, days) & np.isin(expiries, tdays)]
+                pos = np.searchsorted(expiries, days, side='left')
+                day = np.flatnonzero((pos < expiries.shape[0]) & ontdays)
+                rows['day'].append(day)
+                rows['expiry'].append(np.searchsorted(days, expiries[pos[day]]))
+                rows['open'].append(np.where(pos[day] > 0, np.searchsorted(days, expiries[np.maximum(pos[day] - 1, 0)]), -1))
+                rows['freq'].append(np.full(day.shape[0], sched.freq, dtype=object))
+            day, expiry, open, freq = (np.concatenate(rows[key]) for key in ['day', 'expiry', 'open', 'freq'])
+
+            df = {(self.group,'freq'): freq
+                , (self.group,'expiry'): days[expiry]
+                , (self.group,'open'): np.where(open >= 0, days[np.maximum(open, 0)], np.array('NaT', dtype='datetime64[ns]'))
+                , (self.group,'dte'): (days[expiry] - days[day])/np.timedelta64(1, 'D')
+                , (self.group,'obsdte'): np.searchsorted(tdays, days[expiry]) - np.searchsorted(tdays, days[day])}
+            df.update({(self.group,var): values for var, values in self.getpaths(day, expiry, open).items()})
+            self.dfpath = pd.DataFrame(df, index=self.idx.index[day])
+            self.dfpath.columns = pd.MultiIndex.from_tuples(self.dfpath.columns, names=["group", "var"])
+            print(f'underlying.setpaths success {self.group}')
+        except Exception as e:
+            print(f'underlying.setpaths failed {self.group}')
+            print(e)
+        finally:
+            return
+
     def setrtn(self):
         '''
         desc:   self.df.shape[0]>self.rtn.shape[0]
@@ -211,9 +457,8 @@ class underlying(object):
         try:
             self.settdays()
             self.setsched()
-            self.getsched()
-            self.setobs()
-            self.setfill()
+            self.setalign()
+            self.setpaths()
             self.setrtn()
             print(f'underlying.setmeasures success {self.group}')
         except Exception as e:
@@ -222,8 +467,133 @@ class underlying(object):
         finally:
             return
 
-    def setdescribe(self, _grouper=['freq','dir'], _keep=['freq','dir','lnr','lnr^2'], _period=26*5, _quantiles=np.linspace(.1, 1, 9, 0)):
+    def setstate(self):
+        '''
+        desc:   state for update from self.df after setmeasures. the schedules and tdays
+                must run past the bars to come. expiries after the last bar are taken to be
+                trading days that get a bar, as setalign keeps only expiries on idx.
+                bars on tdays after the last expiry of the history start the cycle, setalign
+                leaves them nan until their expiry is on idx
+        '''
+        expiry, freq, day, open, diff, obsdiff = self.getexpiries()
+        days = self.idx.index.values.astype('datetime64[ns]')
+        tdays = np.sort(self.tdays.getschedidx().values.astype('datetime64[ns]'))
+        last = days[-1] if days.shape[0] else np.array('NaT', dtype='datetime64[ns]')
+        kept = np.flatnonzero(np.isin(expiry, tdays) & (np.isin(expiry, days) | (expiry > last)))
+        pointer = np.searchsorted(expiry[kept], last, side='right') if days.shape[0] else 0
+
+        cln = self.rtn['cln'].reindex(self.idx.index).to_numpy(dtype=float)
+        path = np.cumsum(np.where(np.isnan(cln), 0., cln))
+        start = np.searchsorted(days, expiry[kept[pointer - 1]], side='right') if pointer > 0 else 0
+        cycle = [(position, path[position], days[position]) for position in range(start, days.shape[0]) if np.isin(days[position], tdays)]
+        opens = np.flatnonzero(np.isin(days, expiry))[-self.OPENS:]
+        self.state = {'expiry': expiry, 'freq': freq, 'day': day, 'open': open, 'diff': diff, 'obsdiff': obsdiff
+            , 'tdays': tdays, 'kept': kept, 'pointer': pointer
+            , 'bars': self.getdf().shape[0], 'path': path[-1] if path.shape[0] else 0.
+            , 'opens': deque(zip(days[opens], path[opens]), maxlen=self.OPENS), 'cycle': cycle}
+        return
+
+    def setvalue(self, _position, _var, _value):
+        '''
+        desc:   set a bar of self.df or of the pending bars by its position
+        '''
+        if _position < self.df.shape[0]:
+            self.df.iloc[_position, self.df.columns.get_loc((self.group,_var))] = _value
+        else:
+            self.pending[_position - self.df.shape[0]][(self.group,_var)] = _value
+        return
+
+    def getalign(self, _row, _date, _pos):
+        '''
+        desc:   expiry, freq, day, open, dte, obsdte of a bar on tdays at _pos of _date, as setalign
+        '''
+        state = self.state
+        return {'expiry': pd.Timestamp(state['expiry'][_row])
+            , 'freq': state['freq'][_row]
+            , 'day': state['day'][_row]
+            , 'open': pd.Timestamp(state['open'][_row])
+            , 'dte': (state['expiry'][_row] - _date)/np.timedelta64(1, 'D')
+            , 'obsdte': float(np.searchsorted(state['tdays'], state['expiry'][_row]) - _pos)}
+
+    def update(self, _bar):
+        '''
+        desc:   add one bar, a row of rtn named by its date. the next expiry pointer moves past
+                expiries before the bar, the row is set as setalign and setrtn set it. the bars
+                of a cycle are set again when its expiry bar arrives, as an expiry without a bar
+                moves them to the next, with their path returns, nan until then. the path is
+                kept at the expiry dates only, the open of a cycle of any length.
+                self.dfpath is left to setpaths
+        '''
+        if self.state is None:
+            self.setstate()
+        state = self.state
+        date = pd.Timestamp(_bar.name).to_datetime64().astype('datetime64[ns]')
+        expiry, kept = state['expiry'], state['kept']
+        pointer = state['pointer']
+        while pointer < kept.shape[0] and expiry[kept[pointer]] < date:
+            pointer += 1
+        if pointer >= kept.shape[0] or date > state['tdays'][-1]:
+            raise ValueError(f'underlying.update {self.group} {_bar.name} is past the schedules, extend them')
+        state['pointer'] = pointer
+
+        lnr = float(_bar['cln'])
+        state['path'] += 0. if np.isnan(lnr) else lnr
+        if np.isin(date, expiry):
+            state['opens'].append((date, state['path']))
+        pos = np.searchsorted(state['tdays'], date)
+        valid = state['tdays'][pos] == date
+
+        row = kept[pointer]
+        isexpiry = valid and expiry[row] == date
+        values = self.getalign(row, date, pos) if valid else {'expiry': pd.NaT, 'freq': np.nan, 'day': np.nan, 'open': pd.NaT, 'dte': np.nan, 'obsdte': np.nan}
+        values = {'expiry': values['expiry'], 'freq': values['freq'], 'day': values['day'], 'open': values['open']
+            , 'diff': state['diff'][row] if isexpiry else np.nan
+            , 'obsdiff': state['obsdiff'][row] if isexpiry else np.nan
+            , 'dte': values['dte'], 'obsdte': values['obsdte']
+            , 'rtnexpiry': np.nan, 'rtnopen': np.nan, 'maxexpiry': np.nan, 'minexpiry': np.nan
+            , 'lnr': lnr, 'lnr^2': float(_bar['cln^2']), 'dir': float(_bar['cdir'])}
+        self.pending.append({(self.group,var): value for var, value in values.items()})
+        self.dates.append(_bar.name)
+        position = state['bars']
+        state['bars'] = position + 1
+
+        if valid:
+            state['cycle'].append((position, state['path'], date))
+        if isexpiry:
+            # the cycle ends, alignment and path returns of its bars from the day to expiry
+            opened = dict(state['opens']).get(state['open'][row], np.nan)
+            high = low = state['path']
+            for position, path, day in reversed(state['cycle']):
+                for var, value in self.getalign(row, day, np.searchsorted(state['tdays'], day)).items():
+                    self.setvalue(position, var, value)
+                high, low = max(high, path), min(low, path)
+                self.setvalue(position, 'rtnexpiry', state['path'] - path)
+                self.setvalue(position, 'rtnopen', state['path'] - opened)
+                self.setvalue(position, 'maxexpiry', high - path)
+                self.setvalue(position, 'minexpiry', low - path)
+            state['cycle'] = []
+        return self.pending[-1]
+
+    def setdescribe(self, _grouper=['freq','dir'], _keep=['freq','dir','lnr','lnr^2'], _period=26*5, _quantiles=np.linspace(.1, 1, 9, 0), _sketch=None):
+        '''
+        desc:   quantiles by freq and dir. a sketch takes the bars of ended cycles only,
+                update aligns the bars of a cycle again on its expiry
+        '''
+        until = None
+        if _sketch is not None:
+            expiry = self.getdf()[(self.group,'expiry')]
+            ended = expiry.index[expiry.to_numpy() <= expiry.index[-1]]
+            until = ended[-1] if ended.shape[0] else pd.NaT
         df = self.df[self.group][_keep]
         df = df.dropna()
-        self.dfdesc = optmeas.getrtnqs(_df=df, _grouper=_grouper, _period=_period, _quantiles=_quantiles)
+        self.dfdesc = optmeas.getrtnqs(_df=df, _grouper=_grouper, _period=_period, _quantiles=_quantiles, _sketch=_sketch, _until=until)
+        return
+
+    def setdescribepaths(self, _grouper=['freq','obsdte'], _keep=['freq','obsdte','rtnexpiry','maxexpiry','minexpiry'], _period=26*5, _quantiles=np.linspace(.1, 1, 9, 0)):
+        '''
+        desc:   path returns to expiry by schedule and trading days to expiry
+        '''
+        df = self.dfpath[self.group][_keep]
+        df = df.dropna()
+        self.dfpathdesc = optmeas.getrtnqs(_df=df, _grouper=_grouper, _period=_period, _quantiles=_quantiles)
         return
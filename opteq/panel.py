@@ -0,0 +1,84 @@
+# ####################################
+#   author: Anthony Tooman
+#   date:   202111
+#   desc:   memory mapped price panel
+# ####################################
+
+
+import os
+import numpy as np
+import pandas as pd
+
+
+class panel(object):
+    '''
+    desc:   daily data of many symbols, one memory mapped .npy per field
+            shaped dates x symbols, with a shared date index and symbol directory
+            in _path. fields and symbols are views of the maps, the os page
+            cache decides what is resident
+    '''
+    FIELDS = ['open', 'high', 'low', 'close', 'adjclose', 'volume']
+    INDEX = '_index'
+    SYMBOLS = '_symbols'
+
+    def __init__(self, _path, _mode='r'):
+        self.path = _path
+        self.mode = _mode
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(_path, f'{self.INDEX}.npy')).view('datetime64[ns]'))
+        with open(os.path.join(_path, self.SYMBOLS)) as file:
+            self.symbols = file.read().split('\n')
+        self.directory = {symbol: column for column, symbol in enumerate(self.symbols)}
+        self.fields = {field: np.load(os.path.join(_path, f'{field}.npy'), mmap_mode=_mode) for field in self.FIELDS}
+        return
+
+    def getfield(self, _field):
+        '''
+        desc:   field of all symbols as a dates x symbols frame, no copy
+        '''
+        return pd.DataFrame(self.fields[_field], index=self.dates, columns=self.symbols, copy=False)
+
+    def getseries(self, _field, _symbol):
+        '''
+        desc:   field of one symbol, a strided view of the map
+        '''
+        return pd.Series(self.fields[_field][:, self.directory[_symbol]], index=self.dates, name=_field, copy=False)
+
+    def getdf(self, _symbol):
+        '''
+        desc:   all fields of one symbol from its first to its last date with data
+                columns are views of the maps where pandas keeps them unconsolidated
+        '''
+        df = pd.DataFrame({field: self.getseries(field, _symbol) for field in self.FIELDS}, copy=False)
+        valid = np.flatnonzero(self.fields['adjclose'][:, self.directory[_symbol]] == self.fields['adjclose'][:, self.directory[_symbol]])
+        return df.iloc[valid[0]:valid[-1] + 1] if valid.shape[0] else df.iloc[:0]
+
+    def setsymbol(self, _symbol, _df):
+        '''
+        desc:   write the daily df of a symbol, aligned to the panel dates
+        '''
+        df = _df.reindex(index=self.dates, columns=self.FIELDS)
+        for field in self.FIELDS:
+            self.fields[field][:, self.directory[_symbol]] = df[field].to_numpy(dtype=float)
+        return
+
+    def flush(self):
+        for field in self.FIELDS:
+            self.fields[field].flush()
+        return
+
+
+def createpanel(_path, _dates, _symbols):
+    '''
+    desc:   allocate an empty (nan) panel for _dates x _symbols and open it for writing
+    '''
+    os.makedirs(_path, exist_ok=True)
+    dates = pd.DatetimeIndex(_dates)
+    np.save(os.path.join(_path, f'{panel.INDEX}.npy'), dates.values.astype('datetime64[ns]').view('int64'))
+    with open(os.path.join(_path, panel.SYMBOLS), 'w') as file:
+        file.write('\n'.join(_symbols))
+    for field in panel.FIELDS:
+        data = np.lib.format.open_memmap(os.path.join(_path, f'{field}.npy'), mode='w+', dtype=float, shape=(len(dates), len(_symbols)))
+        data[:] = np.nan
+        data.flush()
+        del data
+    return panel(_path, _mode='r+')
@@ -5,9 +5,29 @@
 # ####################################
 
 
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from scipy.optimize import curve_fit
+from numpy.lib.stride_tricks import sliding_window_view
+
+# polyfit of the parent process, forked into or set once per pool worker
+WORKERFIT = None
+
+def setworker(_fit):
+    '''
+    desc:   process pool initializer, keep the polyfit to fit
+    '''
+    global WORKERFIT
+    WORKERFIT = _fit
+    return
+
+def fitworker(_solver, _rows):
+    '''
+    desc:   fit a block of rows in a pool worker
+    '''
+    return WORKERFIT.fitrows(_solver=_solver, _rows=_rows)
 
 
 class polyfit:
@@ -26,6 +46,8 @@ class polyfit:
 
     featuresy = ['lhln^2-mu-2']
     percent = [0.01,0.1]
+    # the first row of a window scales to exactly 1, kept out however it rounds
+    scaletol = 1e-6
 
     lag1 = 1
     lag2 = 2
@@ -37,19 +59,39 @@ class polyfit:
         self.obs = _obs
         return
 
-    def runner(self):
+    def runner(self, _solver='lstsq', _rows=None, _workers=None):
         '''
         print blocks of obs
+        _solver:    curve_fit, mdlfit per row, needs scipy
+                    lstsq, mdlfitbatch for all rows together, the default
+                    rls, mdlfitrls updating one row at a time
+        _rows:      number of trailing rows to estimate, default obs
+        _workers:   processes fitting blocks of rows, default 1
+                    self.df reaches the workers by fork, or once per worker where fork
+                    is not available, not once per block
         '''
-        # xdata
-        # concat lagged data
-        # normalise data
-        self.polyfit = []
-        for row in range(self.df.shape[0] + 1 - self.obs, self.df.shape[0] + 1):
-            self.polyfit.append(self.mdlfit(_row=row))
+        rows = self.obs if _rows is None else min(_rows, self.df.shape[0] + 1 - self.obs)
+        rows = range(self.df.shape[0] + 1 - rows, self.df.shape[0] + 1)
+
+        if _workers is None or _workers <= 1:
+            self.polyfit = self.fitrows(_solver=_solver, _rows=rows)
+        else:
+            # a few blocks per worker to balance load, results return in row order
+            size = -(-len(rows) // (4*_workers))
+            blocks = [rows[start:start + size] for start in range(0, len(rows), size)]
+            if 'fork' in multiprocessing.get_all_start_methods():
+                setworker(self)
+                pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context('fork'))
+            else:
+                pool = ProcessPoolExecutor(max_workers=_workers, initializer=setworker, initargs=(self,))
+            try:
+                with pool:
+                    self.polyfit = np.concatenate(list(pool.map(fitworker, [_solver]*len(blocks), blocks)))
+            finally:
+                setworker(None)
 
         self.polyfit = pd.DataFrame.from_records(self.polyfit)
-        self.polyfit.index = self.df.tail(self.obs).index
+        self.polyfit.index = self.df.index[rows.start - 1:rows.stop - 1]
         self.polyfit.columns = [(self.group,f'{self.featuresy[0]}-est'),(self.group,'scalarvar'),(self.group,'scalar10pc'),(self.group,'scalar1pct')]
         self.polyfit.columns = pd.MultiIndex.from_tuples(self.polyfit.columns, names=["group", "var"])
         return
@@ -57,6 +99,20 @@ class polyfit:
     def getdf(self):
         return self.polyfit
 
+    def fitrows(self, _solver, _rows):
+        '''
+        fit a range of rows with _solver
+        returns np.ndarray of est, scalarvar, scalar10pc, scalar1pct per row
+        '''
+        # xdata
+        # concat lagged data
+        # normalise data
+        if _solver == 'lstsq':
+            return self.mdlfitbatch(_rows=_rows)
+        elif _solver == 'rls':
+            return self.mdlfitrls(_rows=_rows)
+        return np.array([self.mdlfit(_row=row) for row in _rows]).reshape(-1, 4)
+
     def corr(self, _df, _prd=1):
         '''
         correlation between featuresx and featuresy
@@ -96,7 +152,7 @@ class polyfit:
         yest scaling factors
         '''
         s = _yest/_y
-        s = s[s < 1.]
+        s = s[s < 1. - self.scaletol]
         d = s.describe(percentiles=self.percent)
 
         # scale yest to 99% confidence interval
@@ -135,7 +191,7 @@ class polyfit:
         xnorm = self.poly(_df=xnorm, _ones=np.ones(self.obs).T)
 
         # param is same width as x
-        param = (1./3.)*np.ones((xnorm.shape[1]), dtype=np.float)
+        param = (1./3.)*np.ones((xnorm.shape[1]), dtype=float)
 
         # y = y0 * exp(alpha * x + c)
         # ln(y) - ln(y0) = alpha * x + c
@@ -149,6 +205,7 @@ class polyfit:
         Znorm = Znorm.to_numpy()[0]
 
         # curve_fit
+        from scipy.optimize import curve_fit
         popt, pcov = curve_fit(self.func, xdata=xnorm, ydata=Znorm, p0=param)
 
         '''
@@ -178,3 +235,195 @@ class polyfit:
         yest = yest
 
         return [yest.tail(1).values[0][0], scalarvar, scalar10pct, scalar1pct]
+
+    def lstsq(self, _x, _y):
+        '''
+        least squares for a stack of design matrices
+        _x: (windows, obs, params)
+        _y: (windows, obs)
+        QR solve, params whose R diagonal vanishes are linear combinations of
+        earlier ones (the lagged -mu- features) and are set to 0
+        '''
+        q, r = np.linalg.qr(_x)
+        qty = np.einsum('wop,wo->wp', q, _y)
+        keep = self.independent(_r=r, _obs=_x.shape[1])
+
+        coef = np.zeros(qty.shape)
+        for p in range(qty.shape[1] - 1, -1, -1):
+            c = (qty[:, p] - np.einsum('wp,wp->w', r[:, p, p+1:], coef[:, p+1:])) / np.where(keep[:, p], r[:, p, p], 1.)
+            coef[:, p] = np.where(keep[:, p], c, 0.)
+        return coef
+
+    def independent(self, _r, _obs):
+        '''
+        params of a QR solve whose R diagonal does not vanish
+        '''
+        diag = np.abs(np.diagonal(_r, axis1=-2, axis2=-1))
+        return diag > max(_obs, diag.shape[-1])*np.finfo(float).eps*diag.max(axis=-1, keepdims=True)
+
+    def scaleestbatch(self, _y, _yest):
+        '''
+        scaleest for a stack of windows
+        _y, _yest: (windows, obs)
+        '''
+        s = _yest/_y
+        s = np.where(s < 1. - self.scaletol, s, np.nan)
+        scalarvar = np.nanmean(s, axis=1) - 2.576*np.nanstd(s, axis=1, ddof=1)/np.sqrt(self.obs)
+        scalar10pct, scalar1pct = np.nanquantile(s, [0.1, 0.01], axis=1)
+        return scalarvar, scalar10pct, scalar1pct
+
+    def mdlfitbatch(self, _rows, _block=128):
+        '''
+        mdlfit for many rows
+        the lagged features, log changes and rolling windows are built once for all
+        rows and each block of windows is solved in closed form by lstsq, as func is
+        linear in the coefficients
+        rows with nans in their window return nans
+        '''
+        xcur = self.df[self.featuresx]
+        x = pd.concat([xcur.shift(self.lag1), xcur.shift(self.lag2)], axis=1).to_numpy(dtype=float)
+        xest = pd.concat([xcur.shift(self.lag1-1), xcur.shift(self.lag2-1)], axis=1).to_numpy(dtype=float)
+
+        # Z = ln(y) - ln(y0)
+        y = self.df[self.featuresy[0]].to_numpy(dtype=float)
+        y0 = self.df[self.featuresy[0]].shift(1).to_numpy(dtype=float)
+        Z = np.log(y) - np.log(y0)
+
+        # windows of obs rows, window i ends at row i + obs - 1
+        x = sliding_window_view(x, self.obs, axis=0)
+        xest = sliding_window_view(xest, self.obs, axis=0)
+        y = sliding_window_view(y, self.obs)
+        y0 = sliding_window_view(y0, self.obs)
+        Z = sliding_window_view(Z, self.obs)
+
+        polyfit = np.full((len(_rows), 4), np.nan)
+        err = np.seterr(divide='ignore', invalid='ignore')
+        with warnings.catch_warnings():
+            # windows where every scaling factor is >= 1 describe to nan
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            for start in range(0, len(_rows), _block):
+                i = np.arange(start, min(start + _block, len(_rows))) + _rows.start - self.obs
+
+                xw = np.swapaxes(x[i], 1, 2)
+                xestw = np.swapaxes(xest[i], 1, 2)
+                ok = ~(np.isnan(xw).any(axis=(1, 2)) | np.isnan(xestw).any(axis=(1, 2)) | np.isnan(Z[i]).any(axis=1))
+                i, xw, xestw = i[ok], xw[ok], xestw[ok]
+                if i.shape[0] == 0:
+                    continue
+
+                xnorm = (xw - xw.mean(axis=1, keepdims=True)) / xw.std(axis=1, ddof=1, keepdims=True)
+                xnorm = self.poly(_df=xnorm, _ones=np.ones(xnorm.shape[:2] + (1,)))
+
+                Zmu = Z[i].mean(axis=1)
+                Zstd = Z[i].std(axis=1, ddof=1)
+                Znorm = (Z[i] - Zmu[:, None]) / Zstd[:, None]
+
+                # as in mdlfit, the first Znorm of the window is the ydata curve_fit
+                # broadcasts across the window
+                coef = self.lstsq(_x=xnorm, _y=np.repeat(Znorm[:, :1], self.obs, axis=1))
+
+                # recover y from Z and scale
+                yest = Zstd[:, None]*np.einsum('wop,wp->wo', xnorm, coef) + Zmu[:, None]
+                scalarvar, scalar10pct, scalar1pct = self.scaleestbatch(_y=y[i], _yest=y0[i]*np.exp(yest))
+
+                # estimate Y(t+dt) from the last row
+                xestw = (xestw - xestw.mean(axis=1, keepdims=True)) / xestw.std(axis=1, ddof=1, keepdims=True)
+                xestw = self.poly(_df=xestw[:, -1, :], _ones=np.ones((xestw.shape[0], 1)))
+                yest = Zstd*np.einsum('wp,wp->w', xestw, coef) + Zmu
+                yest = y[i, -1]*np.exp(yest)
+
+                polyfit[i - _rows.start + self.obs] = np.c_[yest, scalarvar, scalar10pct, scalar1pct]
+        np.seterr(**err)
+        return polyfit
+
+    def mdlfitrls(self, _rows, _reset=None):
+        '''
+        mdlfit for consecutive rows by sliding window recursive least squares
+        each row adds the newest observation to the inverse gram matrix (rank-one update)
+        and drops the expired one (rank-one downdate), O(params^2)
+
+        the design is held in the normalisation of the last reset window, which spans
+        the same polynomials as each window's own normalisation, so fitted values are
+        unchanged. the estimate row is mapped from the window's normalisation into
+        the reset one using the rolling means and stds. _reset rows, default obs,
+        between full refits bound the drift of the updates
+        params dropped by lstsq on the first window are left out
+        drift against mdlfitbatch: the estimate within 1e-11 relative on a design of
+        full rank, within 1e-4 on the featuregraph features, whose lagged means are
+        close to collinear and lose precision in the downdates, and the scaling
+        factors within 1e-7. a shorter _reset does not tighten the 1e-4, the drift
+        builds within a few rows of a refit
+        '''
+        reset = self.obs if _reset is None else _reset
+        xcur = self.df[self.featuresx]
+        x = pd.concat([xcur.shift(self.lag1), xcur.shift(self.lag2)], axis=1)
+        xest = pd.concat([xcur.shift(self.lag1-1), xcur.shift(self.lag2-1)], axis=1)
+
+        # rolling means and stds of each window ending at the row
+        xmu, xstd = x.rolling(self.obs).mean().to_numpy(), x.rolling(self.obs).std().to_numpy()
+        xestmu, xeststd = xest.rolling(self.obs).mean().to_numpy(), xest.rolling(self.obs).std().to_numpy()
+        x, xest = x.to_numpy(dtype=float), xest.to_numpy(dtype=float)
+
+        # Z = ln(y) - ln(y0)
+        y = self.df[self.featuresy[0]]
+        y0 = y.shift(1)
+        Z = np.log(y) - np.log(y0)
+        Zmu, Zstd = Z.rolling(self.obs).mean().to_numpy(), Z.rolling(self.obs).std().to_numpy()
+        y, y0, Z = y.to_numpy(dtype=float), y0.to_numpy(dtype=float), Z.to_numpy(dtype=float)
+
+        # windows with nans are not fitted
+        nans = np.isnan(x).any(axis=1) | np.isnan(xest).any(axis=1) | np.isnan(Z)
+        nans = np.concatenate([[0], np.cumsum(nans)])
+
+        polyfit = np.full((len(_rows), 4), np.nan)
+        err = np.seterr(divide='ignore', invalid='ignore')
+        with warnings.catch_warnings():
+            # windows where every scaling factor is >= 1 describe to nan
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            anchor, keep = None, None
+            for n, row in enumerate(_rows):
+                if nans[row] - nans[row - self.obs] > 0:
+                    anchor = None
+                    continue
+
+                if anchor is None or row - anchor >= reset:
+                    # full refit in the normalisation of the window ending at row - 1
+                    anchor = row
+                    mu, std = xmu[row-1], xstd[row-1]
+                    xnorm = (x[row-self.obs:row+reset-1] - mu)/std
+                    xnorm = self.poly(_df=xnorm, _ones=np.ones((xnorm.shape[0], 1)))
+                    if keep is None:
+                        keep = self.independent(_r=np.linalg.qr(xnorm[:self.obs], mode='r'), _obs=self.obs)
+                    scale = 1./np.linalg.norm(xnorm[:self.obs, keep], axis=0)
+                    xnorm = xnorm[:, keep]*scale
+
+                    # P = (X'X)^-1 and w, the fit of a target of ones, from a QR solve
+                    q, r = np.linalg.qr(xnorm[:self.obs])
+                    rinv = np.linalg.inv(r)
+                    P = np.dot(rinv, rinv.T)
+                    w = np.dot(rinv, q.sum(axis=0))
+                else:
+                    # add row - 1, expire row - 1 - obs
+                    for add, sign in ((xnorm[row-anchor+self.obs-1], 1.), (xnorm[row-anchor-1], -1.)):
+                        Padd = np.dot(P, add)
+                        P -= sign*np.outer(Padd, Padd)/(1. + sign*np.dot(add, Padd))
+                        w += sign*np.dot(P, add)*(1. - np.dot(add, w))
+                xwin = xnorm[row-anchor:row-anchor+self.obs]
+
+                # as in mdlfit, the first Znorm of the window is the ydata curve_fit
+                # broadcasts across the window, so the fit is Znorm times the fit of ones
+                coef = w*(Z[row-self.obs] - Zmu[row-1])/Zstd[row-1]
+
+                # recover y from Z and scale
+                yest = Zstd[row-1]*np.dot(xwin, coef) + Zmu[row-1]
+                scalarvar, scalar10pct, scalar1pct = self.scaleestbatch(_y=y[None, row-self.obs:row]
+                    , _yest=(y0[row-self.obs:row]*np.exp(yest))[None, :])
+
+                # estimate Y(t+dt), window normalisation mapped into the anchor normalisation
+                xlast = xmu[row-1] + xstd[row-1]*(xest[row-1] - xestmu[row-1])/xeststd[row-1]
+                xlast = self.poly(_df=((xlast - mu)/std)[None, :], _ones=np.ones((1, 1)))[0, keep]*scale
+                yest = y[row-1]*np.exp(Zstd[row-1]*np.dot(xlast, coef) + Zmu[row-1])
+
+                polyfit[n] = [yest, scalarvar[0], scalar10pct[0], scalar1pct[0]]
+        np.seterr(**err)
+        return polyfit
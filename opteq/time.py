@@ -50,3 +50,17 @@ def getidx(_group, _df):
         print(f'getidx failed with {_group}')
     finally:
         return df
+
+
+def getidxbar(_group, _date, _lastdate, _last):
+    '''
+    desc:   the getidx row of a new bar _date, following _last, the getidx row of _lastdate
+    '''
+    diff = float((_date - _lastdate).days)
+    diffsum = _last[(_group,'diffsum')]
+    yrdays = getdays(_date.year)
+    return {(_group,'obs'): _last[(_group,'obs')] + 1
+        , (_group,'diff'): diff
+        , (_group,'diffsum'): diff if pd.isna(diffsum) else diffsum + diff
+        , (_group,'yrdays'): yrdays
+        , (_group,'yrfrac'): diff/yrdays}
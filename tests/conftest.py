@@ -0,0 +1,39 @@
+# ####################################
+#   desc:   shared fixtures, synthetic daily data and the opteq.py script as a module
+# ####################################
+
+
+import os
+import sys
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+
+PATHROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PATHROOT)
+
+
+def getohlc(_obs, _seed=0, _start='2018-01-02'):
+    '''
+    desc:   daily df of a random walk, the columns of instrument.df
+    '''
+    rng = np.random.default_rng(_seed)
+    index = pd.bdate_range(_start, periods=_obs)
+    close = 3000*np.exp(np.cumsum(rng.normal(0, 0.01, _obs)))
+    open = close*np.exp(rng.normal(0, 0.004, _obs))
+    high = np.maximum(open, close)*np.exp(np.abs(rng.normal(0, 0.005, _obs)))
+    low = np.minimum(open, close)*np.exp(-np.abs(rng.normal(0, 0.005, _obs)))
+    return pd.DataFrame({'open': open, 'high': high, 'low': low, 'close': close, 'adjclose': close
+        , 'volume': rng.integers(10**6, 5*10**6, _obs)}, index=index)
+
+@pytest.fixture
+def ohlc():
+    return getohlc
+
+@pytest.fixture(scope='session')
+def opteqmain():
+    spec = importlib.util.spec_from_file_location('opteqmain', os.path.join(PATHROOT, 'opteq.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,147 @@
+import io
+import json
+import time
+import asyncio
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+import pytest
+
+import opteq.data as optdata
+
+
+def getpayload(_obs=5):
+    '''
+    desc:   chart payload of _obs daily bars
+    '''
+    timestamp = [int(date.timestamp()) for date in pd.bdate_range('2021-01-04', periods=_obs)]
+    quote = {var: list(np.linspace(100., 101., _obs)) for var in ['open', 'high', 'low', 'close']}
+    quote['volume'] = [1000]*_obs
+    return {'chart': {'result': [{'timestamp': timestamp, 'indicators': {'quote': [quote], 'adjclose': [{'adjclose': quote['close']}]}}]}}
+
+class chartserver(object):
+    '''
+    desc:   local stand-in for the chart endpoint. symbols RATE answer 429 with
+            Retry-After once, DOWN answer 503 always, the others 200 after _delay
+    '''
+
+    def __init__(self, _delay=0.05, _retryafter='1'):
+        self.requests = []
+        self.inflight = 0
+        self.maxinflight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            def log_message(self, *_args):
+                return
+
+            def do_GET(self):
+                symbol = self.path.split('?')[0].rsplit('/', 1)[-1]
+                with server.lock:
+                    server.requests.append((symbol, time.monotonic()))
+                    server.inflight += 1
+                    server.maxinflight = max(server.maxinflight, server.inflight)
+                    count = sum(1 for request in server.requests if request[0] == symbol)
+                try:
+                    time.sleep(_delay)
+                    if symbol.startswith('RATE') and count == 1:
+                        self.send(429, b'', {'Retry-After': _retryafter})
+                    elif symbol.startswith('DOWN'):
+                        self.send(503, b'')
+                    else:
+                        self.send(200, json.dumps(getpayload()).encode())
+                finally:
+                    with server.lock:
+                        server.inflight -= 1
+
+            def send(self, _status, _body, _headers={}):
+                self.send_response(_status)
+                for key, value in _headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(_body)))
+                self.end_headers()
+                self.wfile.write(_body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def gettimes(self, _symbol):
+        return [at for symbol, at in self.requests if symbol == _symbol]
+
+@pytest.fixture
+def server():
+    pytest.importorskip('requests')
+    server = chartserver()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+def getprovider(_server, _retries=2):
+    provider = optdata.yahoofin(_hosturl=_server.url)
+    provider.RETRIES = _retries
+    provider.BACKOFF = 0.01
+    return provider
+
+def test_getdailies_retry_after(server):
+    with contextlib.redirect_stdout(io.StringIO()):
+        dfs = getprovider(server).getdailies(['RATE'])
+    assert dfs['RATE'].shape == (5, 6)
+    first, second = server.gettimes('RATE')
+    # the backoff is 0.01s, the wait is that of Retry-After
+    assert second - first >= 0.9
+
+def test_getdailies_gives_up(server):
+    with contextlib.redirect_stdout(io.StringIO()):
+        dfs = getprovider(server, _retries=2).getdailies(['DOWN', 'SPX'])
+    assert dfs['DOWN'] is None and dfs['SPX'].shape == (5, 6)
+    assert len(server.gettimes('DOWN')) == 3
+
+def test_getdailies_concurrency(server):
+    symbols = [f'S{symbol}' for symbol in range(12)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        dfs = getprovider(server).getdailies(symbols, _concurrency=3)
+    assert all(dfs[symbol] is not None for symbol in symbols)
+    assert server.maxinflight == 3
+
+def test_getdailies_running_loop(server):
+    async def notebook():
+        return getprovider(server).getdailies(['SPX']), await getprovider(server).agetdailies(['NDX'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        dfs, adfs = asyncio.run(notebook())
+    assert dfs['SPX'].shape == adfs['NDX'].shape == (5, 6)
+
+def getdaily(_obs, _start='2021-01-04'):
+    df = getpayload(_obs)['chart']['result'][0]['indicators']['quote'][0]
+    df = pd.DataFrame(df, index=pd.bdate_range(_start, periods=_obs))
+    df['adjclose'] = df['close']*0.99
+    return df[['open', 'high', 'low', 'close', 'adjclose', 'volume']]
+
+def test_migrate_csv_npy(tmp_path):
+    path, df = str(tmp_path) + '/', getdaily(30)
+    csv, npy = optdata.yahoofin(), optdata.yahoofin(_store=optdata.npystore())
+    with contextlib.redirect_stdout(io.StringIO()):
+        csv.writedaily(df, 'SYN', path)
+        npy.migratedaily('SYN', path)
+        read = npy.readdaily('SYN', path)
+    pd.testing.assert_frame_equal(read, csv.readdaily('SYN', path), check_freq=False)
+    pd.testing.assert_frame_equal(read, df, check_freq=False)
+
+@pytest.mark.parametrize('_store', ['npy', 'parquet'])
+def test_store_append_overlap(tmp_path, _store):
+    if _store == 'parquet':
+        pytest.importorskip('pyarrow')
+    store = optdata.npystore() if _store == 'npy' else optdata.parquetstore()
+    file = store.getfile('yahoofin', 'SYN', str(tmp_path) + '/')
+    df = getdaily(30)
+    store.write(df.iloc[:20], file)
+    # the last written date arrives again revised, the appended row wins
+    revised = df.iloc[19:].copy()
+    revised.iloc[0, revised.columns.get_loc('close')] += 1.
+    store.append(revised, file)
+    read = store.read(file)
+    assert read.index.is_unique and read.shape == df.shape
+    pd.testing.assert_frame_equal(read, pd.concat([df.iloc[:19], revised]), check_freq=False)
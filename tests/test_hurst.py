@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import opteq.hurst as opthurst
+
+
+def getseries(_kind, _obs=400, _seed=0):
+    rng = np.random.default_rng(_seed)
+    changes = rng.normal(0, 0.01, _obs)
+    return 100*np.exp(np.cumsum(changes)) if _kind == 'price' else changes
+
+@pytest.mark.parametrize('_kind', ['price', 'change'])
+@pytest.mark.parametrize('_simplified', [False, True])
+def test_getrolling_gethurst(_kind, _simplified):
+    series, prd = getseries(_kind), 130
+    rolling = opthurst.hurst(_kind, _simplified).getrolling(series, prd)
+    loop = [opthurst.hurst(_kind, _simplified).gethurst(series[end - prd:end]) for end in range(prd, series.shape[0] + 1)]
+    assert np.isnan(rolling[:prd - 1]).all()
+    np.testing.assert_allclose(rolling[prd - 1:], loop, rtol=1e-10)
+
+@pytest.mark.parametrize('_kind', ['price', 'change'])
+@pytest.mark.parametrize('_simplified', [False, True])
+def test_hurstonline_getrolling(_kind, _simplified):
+    series, prd = getseries(_kind, _seed=1), 130
+    # a nan restarts the online window, rolling leaves out the windows that hold it
+    series[250] = np.nan
+    rolling = opthurst.hurst(_kind, _simplified).getrolling(series, prd)
+    online = opthurst.hurstonline(prd, _kind, _simplified).extend(series)
+    assert np.isnan(rolling).sum() == 2*(prd - 1) + 1
+    # simplified chunks keep running sums, a few ulps lost per add and expire
+    np.testing.assert_allclose(online, rolling, rtol=1e-8)
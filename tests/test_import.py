@@ -0,0 +1,22 @@
+import sys
+import json
+import subprocess
+
+from conftest import PATHROOT
+
+# seconds to import the opteq modules in a new interpreter, mostly the pandas import
+IMPORTSECONDS = 1.5
+# imported at first use only
+DEFERRED = ['scipy', 'pandas_ta', 'pandas_market_calendars', 'openpyxl', 'requests', 'matplotlib']
+
+
+def test_import_time():
+    code = ('import sys, time, json; start = time.perf_counter()'
+        '; import opteq.measures, opteq.option, opteq.instrument, opteq.data'
+        '; print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))')
+    runs = [json.loads(subprocess.run([sys.executable, '-c', code], cwd=PATHROOT, capture_output=True, text=True, check=True).stdout)
+        for repeat in range(3)]
+    seconds = min(run[0] for run in runs)
+    loaded = [module for module in DEFERRED if module in runs[0][1]]
+    assert not loaded, f'imported at module level: {loaded}'
+    assert seconds < IMPORTSECONDS, f'import took {seconds:.2f}s, over {IMPORTSECONDS}s'
@@ -0,0 +1,42 @@
+import io
+import contextlib
+import pandas as pd
+
+import opteq.data as optdata
+import opteq.instrument as optinst
+from conftest import getohlc
+
+
+class cachedfin(optdata.yahoofin):
+    '''
+    desc:   yahoofin serving the bars of _df within _obsin days of today
+    '''
+
+    def __init__(self, _df):
+        super().__init__()
+        self.df = _df
+
+    def getdaily(self, _symbol='^GSPC', _region='US', _interval='1d', _obsin='252d', _events='div,split', _scale=1.0):
+        return self.df.loc[self.df.index >= pd.Timestamp.today().normalize() - pd.Timedelta(_obsin)].copy()
+
+
+def test_refreshdaily_trim(tmp_path):
+    today = pd.Timestamp.today().normalize()
+    df = getohlc(2000, 4, _start=today - pd.tseries.offsets.BDay(1999))
+    provider = cachedfin(df)
+    inst = optinst.stock(_dataprovider=provider, _symbol='SYN', _path=str(tmp_path) + '/')
+    start = today - pd.Timedelta('400d')
+    with contextlib.redirect_stdout(io.StringIO()):
+        provider.writedaily(df.iloc[:-10], 'SYN', inst.path)
+        inst.refreshdaily(_obsin='400d')
+        cached = provider.readdaily('SYN', inst.path)
+    assert inst.df.index.min() >= start and inst.df.index.max() == df.index.max()
+    assert cached.shape[0] == inst.df.shape[0] == (df.index >= start).sum()
+
+    # a bar later only the new bar is appended, the stale bar stays in the file until the next trim
+    provider.df = getohlc(2001, 4, _start=df.index[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        inst.refreshdaily(_obsin='400d')
+        cached = provider.readdaily('SYN', inst.path)
+    assert inst.df.index.max() == provider.df.index.max() and inst.df.index.min() >= start
+    assert cached.shape[0] <= inst.df.shape[0] + 2
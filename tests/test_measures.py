@@ -0,0 +1,100 @@
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+
+import opteq.measures as optmeas
+import opteq.time as opttime
+
+
+def test_rollingstats_inf():
+    values = np.random.default_rng(0).normal(size=300)
+    values[50], values[120], values[121] = -np.inf, np.inf, np.nan
+    expected = pd.Series(values).replace([np.inf, -np.inf], np.nan)
+    stats = optmeas.getrollingstats(values, [2, 3, 40])
+    for prd, (mean, min, max) in stats.items():
+        np.testing.assert_allclose(mean, expected.rolling(prd).mean(), rtol=1e-12)
+        np.testing.assert_array_equal(min, expected.rolling(prd).min())
+        np.testing.assert_array_equal(max, expected.rolling(prd).max())
+    assert np.isfinite(stats[3][0][125:]).all()
+
+def test_stats_zero_open(ohlc):
+    df = ohlc(600, 2)
+    df.iloc[100, df.columns.get_loc('open')] = 0.
+    graph = optmeas.getfeaturegraph()
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch = graph.getrtn(df).getdf()
+        stream = optmeas.featurestream(optmeas.getfeaturegraph(), df.iloc[:98])
+        for date, bar in df.iloc[98:].iterrows():
+            stream.update(bar)
+    mean = batch[('rtn','oln^2-mu-3')]
+    assert mean.iloc[:100].notna().sum() > 90 and mean.iloc[103:].notna().all() and mean.iloc[100:103].isna().all()
+    streamed = stream.getdf()
+    for column in batch.columns:
+        np.testing.assert_allclose(streamed[column], batch[column], rtol=1e-8, err_msg=str(column))
+
+def test_sketch_growing_frame(ohlc):
+    df = ohlc(900, 3)
+    graph = optmeas.getfeaturegraph()
+    quants = [0.1, 0.5, 0.9]
+    sketch = optmeas.groupsketch(['dir','lengrp'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        rtn = graph.getrtn(df).getdf()
+        for obs in [500, 700, 700, 900]:
+            idx = opttime.getidx(_group='idx', _df=df.iloc[:obs])
+            run = optmeas.runner(_idx=idx['idx'], _rtn=rtn['rtn'].iloc[:obs], _group='runner')
+            run.setrun()
+            run.setdescribe(_quantiles=quants, _sketch=sketch)
+        once = optmeas.groupsketch(['dir','lengrp'])
+        run.setdescribe(_quantiles=quants, _sketch=once)
+    runs = run.getdf()['runner']
+    ended = runs.loc[runs['runid'] < runs['runid'].iloc[-1], ['dir','lengrp','lnr','lnr^2']].dropna()
+    counts = ended.groupby(['dir','lengrp'])['lnr'].count()
+    assert sketch.watermark == once.watermark == ended.index[-1]
+    assert sorted(sketch.sketches) == sorted(once.sketches)
+    for (key, column), quantiles in sketch.sketches.items():
+        assert quantiles.count == once.sketches[(key, column)].count == counts[key]
+
+def test_sketch_zero_values():
+    values = np.concatenate([np.zeros(40), np.random.default_rng(1).normal(size=160)])
+    with np.errstate(all='raise'):
+        sketch = optmeas.quantilesketch().update(values)
+    assert sketch.zero == 40 and sketch.count == 200
+    exact = np.quantile(values, [0.1, 0.3, 0.5, 0.9])
+    np.testing.assert_allclose(sketch.getquantiles([0.1, 0.3, 0.5, 0.9]), exact, atol=0.005*np.abs(exact).max() + 1e-12)
+
+def getwilderrsi(_close, _length, _drift=1):
+    '''
+    desc:   reference rsi as pandas_ta.rsi, gains and losses smoothed by wilder's rma
+    '''
+    change = _close.diff(_drift)
+    rma = lambda _x: _x.ewm(alpha=1/_length, min_periods=_length).mean()
+    gains, losses = rma(change.clip(lower=0)), rma(-change.clip(upper=0))
+    return 100*gains/(gains + losses)
+
+def test_getrsi_wilder(ohlc):
+    close = ohlc(3000, 6)['close']
+    close.iloc[[700, 1500, 1501]] = np.nan
+    lengths = [2, 14, 30]
+    rsi = optmeas.getrsi(close.to_numpy(), lengths)
+    for i, length in enumerate(lengths):
+        expected = getwilderrsi(close, length).to_numpy()
+        np.testing.assert_array_equal(np.isnan(rsi[:, i]), np.isnan(expected))
+        np.testing.assert_allclose(rsi[:, i], expected, rtol=0, atol=1e-12)
+    columns = np.stack([close.to_numpy(), close.to_numpy()[::-1]], axis=1)
+    np.testing.assert_array_equal(optmeas.getrsi(columns, lengths)[:, :, 1], optmeas.getrsi(columns[:, 1], lengths))
+
+@pytest.mark.parametrize('_grouper', ['dir', ['dir', 'lengrp']])
+def test_getgroupqs_describe(_grouper):
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({'dir': rng.choice([-1., 1., np.nan], 900, p=[0.45, 0.45, 0.1]), 'lengrp': rng.integers(1, 6, 900).astype(float)
+        , 'lnr': rng.normal(0, 0.01, 900), 'lnr^2': rng.normal(0, 0.01, 900)**2}, index=pd.bdate_range('2018-01-02', periods=900))
+    df.iloc[::37, 2] = np.nan
+    df = df.drop(columns=[] if isinstance(_grouper, list) else ['lengrp'])
+    quants = [0.01, 0.1, 0.3, 0.7, 0.9, 0.99]
+    expected = df.groupby(_grouper).tail(130).groupby(_grouper).describe(percentiles=quants)
+    result = optmeas.getgroupqs(df, _grouper, 130, quants)
+    pd.testing.assert_index_equal(result.index, expected.index)
+    pd.testing.assert_index_equal(result.columns, expected.columns)
+    np.testing.assert_allclose(result.to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-12, atol=1e-15)
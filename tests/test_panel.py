@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import opteq.panel as optpanel
+import opteq.instrument as optinst
+
+
+@pytest.fixture
+def panel(tmp_path, ohlc):
+    df = ohlc(60, 2)
+    written = optpanel.createpanel(str(tmp_path), df.index, ['A', 'B'])
+    written.setsymbol('A', df.iloc[5:50])
+    written.flush()
+    return written, df
+
+def test_panel_views(panel):
+    written, df = panel
+    series = written.getseries('close', 'A')
+    assert np.shares_memory(series.to_numpy(), written.fields['close'])
+    # a series taken before a write sees it, both are the map
+    written.setsymbol('A', df)
+    np.testing.assert_array_equal(series.to_numpy(), df['close'].to_numpy())
+    assert written.getseries('close', 'B').isna().all()
+
+def test_panel_read(panel, tmp_path):
+    written, df = panel
+    read = optpanel.panel(str(tmp_path))
+    frame = read.getdf('A')
+    pd.testing.assert_frame_equal(frame, df.iloc[5:50].astype(float), check_freq=False)
+    assert all(np.shares_memory(frame[field].to_numpy(), read.fields[field]) for field in read.FIELDS)
+    assert read.getdf('B').empty
+    with pytest.raises(ValueError):
+        read.getseries('close', 'A').to_numpy()[0] = 0.
+
+def test_stock_readpanel_setidx(panel, tmp_path):
+    read = optpanel.panel(str(tmp_path))
+    stock = optinst.stock(_symbol='A')
+    stock.readpanel(read)
+    stock.setidx()
+    assert all(np.shares_memory(stock.df[('A', field)].to_numpy(), read.fields[field]) for field in read.FIELDS)
+    assert list(read.getdf('A').columns) == read.FIELDS
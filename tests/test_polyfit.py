@@ -0,0 +1,49 @@
+import io
+import warnings
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+
+import opteq.measures as optmeas
+import opteq.polyfit as optfit
+
+
+def getfeatures(_obs, _seed):
+    '''
+    desc:   df of independent lognormal featuresx, a design of full rank
+    '''
+    rng = np.random.default_rng(_seed)
+    return pd.DataFrame(np.exp(0.3*rng.normal(size=(_obs, len(optfit.polyfit.featuresx))))
+        , columns=optfit.polyfit.featuresx, index=pd.bdate_range('2020-01-01', periods=_obs))
+
+@pytest.mark.parametrize('_seed', [0, 1, 2])
+def test_mdlfitbatch_curve_fit(_seed):
+    pytest.importorskip('scipy')
+    fit = optfit.polyfit(_group='rtn', _name='lhln^2', _df=getfeatures(400, _seed), _obs=120)
+    rows = range(390, 401)
+    with warnings.catch_warnings():
+        # curve_fit cannot estimate the covariance of a fit without residuals
+        warnings.simplefilter('ignore')
+        curve = fit.fitrows(_solver='curve_fit', _rows=rows)
+    batch = fit.fitrows(_solver='lstsq', _rows=rows)
+    assert np.isfinite(batch[:, 0]).all()
+    np.testing.assert_allclose(batch, curve, rtol=1e-6)
+
+def test_mdlfitrls_full_rank():
+    fit = optfit.polyfit(_group='rtn', _name='lhln^2', _df=getfeatures(700, 3), _obs=120)
+    rows = range(201, 701)
+    np.testing.assert_allclose(fit.fitrows(_solver='rls', _rows=rows), fit.fitrows(_solver='lstsq', _rows=rows), rtol=1e-9)
+
+@pytest.mark.parametrize('_seed', [4, 5])
+def test_mdlfitrls_features(ohlc, _seed):
+    # the drift bound of the mdlfitrls docstring on the features of main
+    with contextlib.redirect_stdout(io.StringIO()):
+        rtn = optmeas.getfeaturegraph(_group='rtn', _prds=[2, 3, 252]).getrtn(ohlc(1500, _seed)).getdf()
+    fit = optfit.polyfit(_group='rtn', _name='lhln^2', _df=rtn['rtn'], _obs=252)
+    rows = range(601, 1501)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        rls, batch = fit.fitrows(_solver='rls', _rows=rows), fit.fitrows(_solver='lstsq', _rows=rows)
+    np.testing.assert_allclose(rls[:, 0], batch[:, 0], rtol=1e-4)
+    np.testing.assert_allclose(rls[:, 1:], batch[:, 1:], rtol=1e-7)
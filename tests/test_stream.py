@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import opteq.option as optopt
+
+
+def assertframes(_stream, _batch, _rows):
+    '''
+    desc:   streamed and batch frames equal on _rows, dates as dates, floats to 1e-9
+    '''
+    stream, batch = _stream.loc[_rows, _batch.columns], _batch.loc[_rows]
+    for column in batch.columns:
+        if batch[column].dtype.kind in 'fiub':
+            np.testing.assert_allclose(stream[column].astype(float), batch[column].astype(float), rtol=1e-9, atol=1e-12, err_msg=str(column))
+        else:
+            same = (stream[column].astype(str).values == batch[column].astype(str).values) | (stream[column].isna().values & batch[column].isna().values)
+            assert same.all(), (column, np.flatnonzero(~same)[:5])
+
+@pytest.mark.parametrize('_day', ['Tuesday', 'Thursday', 'Friday'])
+def test_stream_matches_batch(ohlc, opteqmain, _day):
+    df = ohlc(1400, 3)
+    df = df.drop(df.index[[10, 11, 500]])
+    df.iloc[1300, df.columns.get_loc('high')] = np.nan
+    cut = [position for position in range(1100, 1110) if df.index[position].day_name() == _day][0] + 1
+    scheds = opteqmain.getscheds(df.index.min(), df.index.max() + pd.Timedelta(days=366))
+
+    batch = opteqmain.stream(df, _scheds=scheds)
+    stream = opteqmain.stream(df.iloc[:cut], _scheds=scheds)
+    for date, bar in df.iloc[cut:].iterrows():
+        stream.update(bar)
+
+    assertframes(stream.getdf(), batch.getdf(), df.index)
+    assertframes(stream.runner.getdf(), batch.runner.getdf(), df.index)
+    option = batch.underlying.getdf()
+    # batch leaves the bars after its last expiry on idx without one
+    assertframes(stream.underlying.getdf(), option, df.index[df.index <= option[('option','expiry')].max()])
+
+def test_stream_quarterly_open(ohlc, opteqmain):
+    df = ohlc(700, 5)
+    start, end = df.index.min(), df.index.max() + pd.Timedelta(days=366)
+    scheds = (optopt.schedule(_dtestart=start, _dteend=end, _freq='B', _busconv='nat')
+        , [optopt.schedule(_dtestart=start, _dteend=end, _freq='QS', _busconv='following')])
+    batch = opteqmain.stream(df, _scheds=scheds)
+    stream = opteqmain.stream(df.iloc[:400], _scheds=scheds)
+    for date, bar in df.iloc[400:].iterrows():
+        stream.update(bar)
+    option = batch.underlying.getdf()
+    rows = df.index[df.index <= option[('option','expiry')].max()]
+    assert option.loc[rows[400:], ('option','rtnopen')].notna().any()
+    assertframes(stream.underlying.getdf(), option, rows)
+
+def test_stream_past_schedules(ohlc, opteqmain):
+    df = ohlc(300, 1)
+    stream = opteqmain.stream(df.iloc[:250], _horizon=30)
+    with pytest.raises(ValueError):
+        for date, bar in df.iloc[250:].iterrows():
+            stream.update(bar)